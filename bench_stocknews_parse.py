@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比stocktitan列表页的两种解析方式（BeautifulSoup / lxml）的耗时，并检查两者解析出的字段是否一致
+
+测试页面可用浏览器另存，或把 crawler.arun 返回的 result.html 写入文件
+页面类型按文件名判断：文件名中含trending的按trending页解析，其余按live/today页解析
+
+用法:
+    python bench_stocknews_parse.py fixtures/stocktitan_live.html fixtures/stocktitan_trending.html
+    python bench_stocknews_parse.py --repeat 50 fixtures/*.html
+"""
+
+import argparse
+import os
+import time
+
+import stocktitan_parser
+
+
+def page_type_of(path):
+    return "trending" if "trending" in os.path.basename(path).lower() else "feed"
+
+
+def time_parser(parse, html_content, page_type, repeat):
+    """返回 (解析结果, 平均每次耗时毫秒)"""
+    items = parse(html_content, page_type)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(html_content, page_type)
+    return items, (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_file(path, repeat):
+    with open(path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+    page_type = page_type_of(path)
+    print(f"{path}（{page_type}，{len(html_content) / 1024:.0f} KB）")
+
+    bs4_items, bs4_ms = time_parser(stocktitan_parser.extract_news_items_bs4, html_content, page_type, repeat)
+    print(f"  BeautifulSoup: {bs4_ms:.2f} ms/次，{len(bs4_items)} 条新闻")
+    if stocktitan_parser.lxml is None:
+        print("  未安装lxml，跳过对比")
+        return True
+
+    lxml_items, lxml_ms = time_parser(stocktitan_parser.extract_news_items_lxml, html_content, page_type, repeat)
+    print(f"  lxml:          {lxml_ms:.2f} ms/次，{len(lxml_items)} 条新闻，快 {bs4_ms / max(lxml_ms, 1e-6):.1f} 倍")
+
+    if lxml_items == bs4_items:
+        print("  两种解析结果一致")
+        return True
+    print("  两种解析结果不一致:")
+    for index, (bs4_item, lxml_item) in enumerate(zip(bs4_items, lxml_items)):
+        if bs4_item != lxml_item:
+            print(f"    第{index + 1}条\n      BeautifulSoup: {bs4_item}\n      lxml:          {lxml_item}")
+    return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="对比stocktitan列表页的BeautifulSoup与lxml解析")
+    parser.add_argument("fixtures", nargs="+", help="保存的列表页HTML文件")
+    parser.add_argument("--repeat", type=int, default=20, help="每种解析方式重复的次数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = [bench_file(path, args.repeat) for path in args.fixtures]
+    if not all(results):
+        raise SystemExit(1)
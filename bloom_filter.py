@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的布隆过滤器，作为去重库前面的快速预检查
+
+- 不在过滤器中的key一定是新的，无需查询去重库
+- 命中只表示“可能见过”，需要去重库做精确确认
+- 位数组保存在文件中并通过mmap访问，多个进程重启后无需重新加载
+- 多个进程共用同一组文件（如36kr和finance脚本共用的去重库、各推特脚本共用的sent_tweets.db）：
+  - 所有读写都在 <path_prefix>.bloom.lock 上加文件锁（查询共享锁，写入/扩容/重建独占锁），
+    并发写入不会丢失位或计数
+  - 层数记录在第0层头部，其他进程新增的层在下次查询或写入时自动打开
+  - 重建时就地清零，不删除文件；重建中途退出时第0层头部留有重建标记，
+    此时所有查询视为“可能见过”，交给去重库确认，直到下次重建完成
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows上不加文件锁，此时不要让多个进程共用同一组过滤器文件
+
+# 魔数, 位数m, 哈希函数个数k, 重建标记, 层数（只在第0层中使用，0表示未记录）, 已加入的key数
+# 重建标记和层数占用原来64位k字段的高4字节（始终为0），与已有的过滤器文件兼容
+HEADER = struct.Struct("<8sQIHHQ")
+MAGIC = b"BLOOM001"
+
+
+class BloomFilter:
+    """单层布隆过滤器，按容量capacity和误判率error_rate计算位数组大小"""
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        size = HEADER.size + (self.num_bits + 7) // 8
+        if os.path.exists(path) and not self._header_matches(path, size):
+            os.remove(path)  # 参数变化或文件损坏，重新创建
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, self.num_bits, self.num_hashes, 0, 0, 0))
+                f.truncate(size)
+        self.file = open(path, "r+b")
+        self.bits = mmap.mmap(self.file.fileno(), size)
+
+    def _header_matches(self, path, size):
+        if os.path.getsize(path) != size:
+            return False
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes, _, _, _ = HEADER.unpack(f.read(HEADER.size))
+        return magic == MAGIC and num_bits == self.num_bits and num_hashes == self.num_hashes
+
+    @property
+    def count(self):
+        return HEADER.unpack_from(self.bits, 0)[5]
+
+    @property
+    def rebuilding(self):
+        return HEADER.unpack_from(self.bits, 0)[3] != 0
+
+    @property
+    def num_layers(self):
+        return HEADER.unpack_from(self.bits, 0)[4]
+
+    def _set_header(self, count=None, rebuilding=None, num_layers=None):
+        _, _, _, old_rebuilding, old_num_layers, old_count = HEADER.unpack_from(self.bits, 0)
+        rebuilding = old_rebuilding if rebuilding is None else int(rebuilding)
+        num_layers = old_num_layers if num_layers is None else num_layers
+        count = old_count if count is None else count
+        HEADER.pack_into(self.bits, 0, MAGIC, self.num_bits, self.num_hashes, rebuilding, num_layers, count)
+
+    def set_rebuilding(self, rebuilding):
+        self._set_header(rebuilding=rebuilding)
+
+    def set_num_layers(self, num_layers):
+        self._set_header(num_layers=num_layers)
+
+    def _positions(self, key):
+        # 双重哈希：由一个摘要派生出k个位置
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        for pos in self._positions(key):
+            if not self.bits[HEADER.size + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        for pos in self._positions(key):
+            index = HEADER.size + (pos >> 3)
+            self.bits[index] |= 1 << (pos & 7)
+        self._set_header(count=self.count + 1)
+
+    def reset(self):
+        """就地清零位数组和计数，文件和映射保持不变，其他进程的映射随之看到清空后的内容"""
+        self.bits[HEADER.size:] = bytes(len(self.bits) - HEADER.size)
+        self._set_header(count=0)
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def flush(self):
+        self.bits.flush()
+
+    def close(self):
+        self.bits.flush()
+        self.bits.close()
+        self.file.close()
+
+
+class ScalableBloomFilter:
+    """
+    可扩容的布隆过滤器：当前层写满后追加一层容量翻倍、误判率减半的新层，
+    各层误判率之和不超过error_rate
+    文件保存为 <path_prefix>.<层号>.bloom，文件锁为 <path_prefix>.bloom.lock
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, path_prefix, initial_capacity=100000, error_rate=0.001):
+        self.path_prefix = path_prefix
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.lock_file = open(f"{path_prefix}.bloom.lock", "a+b")
+        self.layers = []
+        # 创建或校验层文件时持有独占锁，避免两个进程同时创建同一个文件
+        with self._locked(exclusive=True):
+            while os.path.exists(self._layer_path(len(self.layers))):
+                self.layers.append(self._open_layer(len(self.layers)))
+            if not self.layers:
+                self.layers.append(self._open_layer(0))
+            if self.layers[0].num_layers < len(self.layers):
+                self.layers[0].set_num_layers(len(self.layers))
+            self._sync_layers()
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _layer_path(self, index):
+        return f"{self.path_prefix}.{index}.bloom"
+
+    def _open_layer(self, index):
+        capacity = self.initial_capacity * self.GROWTH ** index
+        error_rate = self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** index
+        return BloomFilter(self._layer_path(index), capacity, error_rate)
+
+    def _sync_layers(self):
+        """打开其他进程新增的层，调用方需持有锁"""
+        while len(self.layers) < self.layers[0].num_layers:
+            self.layers.append(self._open_layer(len(self.layers)))
+
+    @property
+    def count(self):
+        with self._locked():
+            self._sync_layers()
+            return sum(layer.count for layer in self.layers)
+
+    @property
+    def rebuilding(self):
+        return self.layers[0].rebuilding
+
+    def __contains__(self, key):
+        with self._locked():
+            if self.layers[0].rebuilding:
+                # 上次重建中途退出，过滤器内容不完整，不能据此判定为新key
+                return True
+            self._sync_layers()
+            return any(key in layer for layer in self.layers)
+
+    def add(self, key):
+        with self._locked(exclusive=True):
+            self._add(key)
+
+    def _add(self, key):
+        # 写入第一个未满的层；重建后从第0层开始重新填充；调用方需持有独占锁
+        self._sync_layers()
+        for layer in self.layers:
+            if not layer.is_full():
+                layer.add(key)
+                return
+        self.layers.append(self._open_layer(len(self.layers)))
+        self.layers[0].set_num_layers(len(self.layers))
+        self.layers[-1].add(key)
+
+    def rebuild(self, keys):
+        """
+        就地清空所有层并重新加入keys，整个过程持有独占锁，其他进程的查询和写入等待重建完成
+        不删除层文件：其他进程仍映射着这些文件
+        """
+        with self._locked(exclusive=True):
+            self._sync_layers()
+            self.layers[0].set_rebuilding(True)
+            self.layers[0].flush()
+            for layer in self.layers:
+                layer.reset()
+            for key in keys:
+                self._add(key)
+            self.flush()
+            self.layers[0].set_rebuilding(False)
+            self.layers[0].flush()
+
+    def flush(self):
+        for layer in self.layers:
+            layer.flush()
+
+    def close(self):
+        for layer in self.layers:
+            layer.close()
+        self.lock_file.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻的Playwright浏览器和可复用的页面池
+
+- 整个进程只启动一个浏览器，不再每抓取一个地址就启动、关闭一次
+- 预先创建 size 个独立的上下文（各自一个页面），同时最多 size 个抓取任务，多余的任务排队等待空闲页面
+- 拦截图片、字体、音视频请求，只下载页面本身和脚本
+- 页面或浏览器崩溃后，下次取用时自动重建
+
+用法:
+    pool = BrowserPool(size=4)
+    await pool.start()
+    async with pool.page() as page:
+        await page.goto(url)
+    await pool.close()
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+
+class BrowserPool:
+    """
+    size: 页面（上下文）数量，即最大并发数
+    browser_type: chromium / firefox / webkit
+    block_resources: 是否拦截图片、字体、音视频
+    context_options: 传给 browser.new_context 的参数，例如 storage_state
+    """
+
+    def __init__(self, size=4, browser_type="chromium", headless=True, block_resources=True, context_options=None):
+        self.size = size
+        self.browser_type = browser_type
+        self.headless = headless
+        self.block_resources = block_resources
+        self.context_options = context_options or {}
+        self.playwright = None
+        self.browser = None
+        self.pages = None
+        self.lock = asyncio.Lock()
+        self.stats = {"launches": 0, "pages_served": 0, "blocked_requests": 0, "recreated_pages": 0}
+
+    async def start(self):
+        await self._ensure_browser()
+
+    async def _ensure_browser(self):
+        """
+        启动浏览器，或在浏览器断开后重新启动
+        由同一把锁串行执行，并发的调用者拿到锁后会发现浏览器已可用而直接返回，不会重复启动
+        """
+        async with self.lock:
+            if self.browser is not None and self.browser.is_connected():
+                return
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            if self.browser is not None:
+                print("浏览器已断开，重新启动...")
+            self.browser = await getattr(self.playwright, self.browser_type).launch(headless=self.headless)
+            self.stats["launches"] += 1
+            if self.pages is None:
+                self.pages = asyncio.Queue()
+                stale_count = self.size
+            else:
+                # 始终使用同一个队列，正在等待空闲页面的任务不受影响；
+                # 队列中旧浏览器的页面换成新页面，已取出的旧页面在归还时替换
+                stale_count = self.pages.qsize()
+                for _ in range(stale_count):
+                    self.pages.get_nowait()
+            for _ in range(stale_count):
+                self.pages.put_nowait(await self._new_page())
+
+    def _usable(self, page):
+        return (not page.is_closed() and self.browser is not None and self.browser.is_connected()
+                and page.context.browser is self.browser)
+
+    async def _new_page(self):
+        context = await self.browser.new_context(**self.context_options)
+        if self.block_resources:
+            await context.route("**/*", self._route)
+        return await context.new_page()
+
+    async def _route(self, route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            self.stats["blocked_requests"] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @asynccontextmanager
+    async def page(self):
+        """取出一个空闲页面，用完后自动归还"""
+        await self._ensure_browser()
+        page = await self.pages.get()
+        try:
+            if not self._usable(page):
+                # 页面已关闭，或属于已断开的旧浏览器
+                await self._ensure_browser()
+                page = await self._new_page()
+                self.stats["recreated_pages"] += 1
+            self.stats["pages_served"] += 1
+            yield page
+        finally:
+            if not self._usable(page) and self.browser is not None and self.browser.is_connected():
+                try:
+                    page = await self._new_page()
+                    self.stats["recreated_pages"] += 1
+                except Exception as e:
+                    print(f"重建页面失败，下次取用时再试: {e}")
+            # 无论页面是否可用都要归还，否则等待中的任务会一直拿不到页面（池已关闭时除外）
+            if self.pages is not None:
+                self.pages.put_nowait(page)
+
+    def report(self):
+        """返回统计信息字符串，供各脚本在每轮结束时打印"""
+        return (f"浏览器池: 启动浏览器 {self.stats['launches']} 次, 使用页面 {self.stats['pages_served']} 次, "
+                f"重建页面 {self.stats['recreated_pages']} 次, 拦截图片/字体/媒体请求 {self.stats['blocked_requests']} 个")
+
+    async def close(self):
+        async with self.lock:
+            if self.browser is not None:
+                await self.browser.close()
+                self.browser = None
+            self.pages = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+已推送条目的去重存储，替代各脚本中从txt/json整体加载、整体重写的集合
+
+- SQLite主键索引查询，不再把全部历史ID常驻内存
+- 每次add只追加一行并立即提交，写锁只持有一条INSERT的时间，多个进程（如36kr和finance脚本、各推特脚本）可共用同一个库
+- 写锁等待超时时不丢弃ID：记在内存中并打印错误，下次add/commit时重试，本进程内不会重复推送
+- 超过有效期的ID按天自动清理，并回收文件空间
+- 内存中只保留一个有上限的最近命中缓存
+- 前置持久化布隆过滤器，绝大多数新ID无需查询SQLite即可确认
+- open_store 让同一进程内使用同一个库文件的多个数据源共享一个实例
+
+一次性迁移旧文件:
+    python dedup_store.py <旧的txt或json文件> <新的db文件>
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+from bloom_filter import ScalableBloomFilter
+
+DEFAULT_TTL = 180 * 24 * 3600  # 默认保留180天
+COMPACT_INTERVAL = 24 * 3600  # 每天最多清理一次过期ID
+LOCK_TIMEOUT = 30  # 等待其他进程释放写锁的最长时间（秒）
+
+
+def load_legacy_ids(legacy_file):
+    """读取旧格式的ID文件：json列表或每行一个ID的文本"""
+    with open(legacy_file, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        ids = json.loads(content)
+        if isinstance(ids, list):
+            return [str(i) for i in ids]
+    except ValueError:
+        pass
+    return [line.strip() for line in content.splitlines() if line.strip()]
+
+
+class DedupStore:
+    """
+    基于SQLite的去重集合，支持 `key in store` 和 `store.add(key)`，可直接替换原来的set
+    legacy_file: 旧的txt/json文件，新库为空时自动迁移一次
+    ttl: ID的保留时长（秒），None表示永不过期
+    memory_cache_size: 内存中最近命中缓存的条数上限
+    bloom_error_rate: 布隆过滤器的误判率，None表示不使用布隆过滤器
+    bloom_capacity: 布隆过滤器第一层的容量，写满后自动扩容
+    """
+
+    def __init__(self, db_file, legacy_file=None, ttl=DEFAULT_TTL, memory_cache_size=10000,
+                 bloom_error_rate=0.001, bloom_capacity=100000):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.memory_cache_size = memory_cache_size
+        self.recent = OrderedDict()
+        self.unsaved = set()  # 因写锁超时尚未写入库的ID
+        self.stats = {"bloom_negative": 0, "store_lookup": 0, "false_positive": 0}
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_file, timeout=LOCK_TIMEOUT)
+        # auto_vacuum需在建表前设置，清理过期ID后可增量回收空间
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA cache_size = -2048")  # 页缓存上限约2MB
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, first_seen REAL NOT NULL) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS seen_first_seen ON seen (first_seen)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.bloom = None
+        if bloom_error_rate is not None:
+            self.bloom = ScalableBloomFilter(db_file, initial_capacity=bloom_capacity, error_rate=bloom_error_rate)
+        if legacy_file and os.path.exists(legacy_file) and len(self) == 0:
+            count = self.import_ids(load_legacy_ids(legacy_file))
+            print(f"已从 {legacy_file} 迁移 {count} 条记录到 {db_file}")
+        elif self.bloom is not None and (self.bloom.count != len(self) or self.bloom.rebuilding):
+            # 过滤器与库不一致（首次启用、其他进程写入、异常退出或重建中途退出），从库中重建
+            self.rebuild_bloom()
+
+    def __contains__(self, key):
+        if key in self.unsaved:
+            return True
+        if key in self.recent:
+            self.recent.move_to_end(key)
+            return True
+        if self.bloom is not None and key not in self.bloom:
+            self.stats["bloom_negative"] += 1
+            return False
+        self.stats["store_lookup"] += 1
+        row = self.conn.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._remember(key)
+            return True
+        if self.bloom is not None:
+            self.stats["false_positive"] += 1
+        return False
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def _remember(self, key):
+        self.recent[key] = None
+        self.recent.move_to_end(key)
+        if len(self.recent) > self.memory_cache_size:
+            self.recent.popitem(last=False)
+
+    def add(self, key):
+        self._remember(key)
+        self.unsaved.add(key)
+        self._save_unsaved()
+
+    def _save_unsaved(self):
+        """写入尚未入库的ID，每个ID单独提交；写锁超时时保留在unsaved中并打印错误"""
+        for key in list(self.unsaved):
+            try:
+                with self.conn:
+                    cursor = self.conn.execute("INSERT OR IGNORE INTO seen (key, first_seen) VALUES (?, ?)", (key, time.time()))
+            except sqlite3.OperationalError as e:
+                print(f"去重库 {self.db_file} 写入失败，{len(self.unsaved)} 个ID暂存内存，稍后重试: {e}")
+                return
+            self.unsaved.discard(key)
+            # 先提交再写布隆过滤器：其他进程重建过滤器时读到的是已提交的行，不会漏掉这个ID
+            if cursor.rowcount and self.bloom is not None:
+                self.bloom.add(key)
+
+    def discard(self, key):
+        # 布隆过滤器不支持删除，残留的位只会增加一次精确查询
+        with self.conn:
+            self.conn.execute("DELETE FROM seen WHERE key = ?", (key,))
+        self.recent.pop(key, None)
+        self.unsaved.discard(key)
+
+    def rebuild_bloom(self):
+        """按库中现有的ID重建布隆过滤器，逐行读取，不把全部ID载入内存"""
+        if self.bloom is None:
+            return
+        self.bloom.rebuild(key for (key,) in self.conn.execute("SELECT key FROM seen"))
+
+    def import_ids(self, ids, first_seen=None):
+        """批量导入ID，返回新增条数"""
+        first_seen = time.time() if first_seen is None else first_seen
+        before = len(self)
+        self.conn.executemany("INSERT OR IGNORE INTO seen (key, first_seen) VALUES (?, ?)", ((key, first_seen) for key in ids))
+        self.conn.commit()
+        self.rebuild_bloom()
+        return len(self) - before
+
+    def commit(self):
+        """重试暂存在内存中的ID，并按需清理过期记录"""
+        self._save_unsaved()
+        self.conn.commit()
+        if self.bloom is not None:
+            self.bloom.flush()
+        self.maybe_compact()
+
+    def expire(self):
+        """删除超过有效期的ID，返回删除条数"""
+        if self.ttl is None:
+            return 0
+        cursor = self.conn.execute("DELETE FROM seen WHERE first_seen < ?", (time.time() - self.ttl,))
+        self.conn.commit()
+        if cursor.rowcount:
+            self.recent.clear()
+        return cursor.rowcount
+
+    def maybe_compact(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'last_compact'").fetchone()
+        now = time.time()
+        if row is not None and now - float(row[0]) < COMPACT_INTERVAL:
+            return
+        removed = self.expire()
+        if removed:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.rebuild_bloom()
+            print(f"去重库 {self.db_file} 清理过期记录 {removed} 条")
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('last_compact', ?)", (str(now),))
+        self.conn.commit()
+
+    def close(self):
+        self._save_unsaved()
+        if self.unsaved:
+            print(f"去重库 {self.db_file} 关闭时仍有 {len(self.unsaved)} 个ID未能写入")
+        self.conn.commit()
+        self.conn.close()
+        if self.bloom is not None:
+            self.bloom.close()
+
+
+open_stores = {}
+
+
+def open_store(db_file, legacy_file=None, **kwargs):
+    """
+    同一进程内每个db文件只打开一次；多个数据源在同一个守护进程中运行且共用一个库文件时，
+    共享同一个连接、内存缓存和布隆过滤器
+    """
+    path = os.path.abspath(db_file)
+    if path not in open_stores:
+        open_stores[path] = DedupStore(db_file, legacy_file=legacy_file, **kwargs)
+    return open_stores[path]
+
+
+def commit_all():
+    """提交所有通过open_store打开的库"""
+    for store in open_stores.values():
+        store.commit()
+
+
+def migrate_legacy_file(legacy_file, db_file):
+    """把旧的txt/json文件一次性导入到db文件，返回新增条数"""
+    store = DedupStore(db_file)
+    try:
+        return store.import_ids(load_legacy_ids(legacy_file))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("使用方法: python dedup_store.py <旧的txt或json文件> <新的db文件>")
+        sys.exit(1)
+    count = migrate_legacy_file(sys.argv[1], sys.argv[2])
+    print(f"迁移完成，新增 {count} 条记录")
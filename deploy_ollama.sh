@@ -5,7 +5,8 @@ if pgrep -x "ollama" > /dev/null; then
     echo "Ollama 已经在运行中"
 else
     echo "启动 Ollama 服务..."
-    # 在后台启动 Ollama 服务
+    # 在后台启动 Ollama 服务，并发数需与 ollama_client.py 读取的 OLLAMA_NUM_PARALLEL 一致
+    export OLLAMA_NUM_PARALLEL=${OLLAMA_NUM_PARALLEL:-4}
     nohup ollama serve > ollama.log 2>&1 &
     
     # 等待服务启动
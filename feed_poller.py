@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+带条件请求的RSS抓取
+
+- 记录每个地址上次响应的 ETag / Last-Modified，下次请求带上 If-None-Match / If-Modified-Since，
+  内容未变化时服务端返回304，不下载也不解析
+- 服务端不支持条件请求时，比较响应体的哈希（忽略每次渲染都会变化的生成时间），未变化则跳过 feedparser.parse
+- 状态保存在json文件中，重启后依然有效
+
+用法:
+    fetcher = ConditionalFeedFetcher("xxx_push/feed_state.json")
+    feed = await fetcher.fetch(session, url)   # 内容未变化时返回None
+    ...处理feed中的条目...
+    fetcher.mark_processed(url)                # 处理完成后才记录本次的校验信息
+    fetcher.save()
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import feedparser
+
+# RSSHub每次渲染都会更新的字段，计算哈希时去掉
+VOLATILE_PATTERN = re.compile(rb"<lastBuildDate>.*?</lastBuildDate>|<updated>.*?</updated>", re.S)
+
+
+def body_hash(body):
+    return hashlib.sha256(VOLATILE_PATTERN.sub(b"", body)).hexdigest()
+
+
+class ConditionalFeedFetcher:
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.state = {}
+        self.pending = {}
+        self.stats = {"not_modified": 0, "unchanged": 0, "changed": 0}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except ValueError:
+                print(f"抓取状态文件 {state_file} 损坏，重新开始记录")
+
+    def _conditional_headers(self, url):
+        headers = {"Accept-Encoding": "gzip, deflate"}
+        state = self.state.get(url, {})
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    async def fetch(self, session, url):
+        """抓取并解析feed，内容未变化时返回None；请求失败时抛出异常"""
+        async with session.get(url, headers=self._conditional_headers(url)) as response:
+            if response.status == 304:
+                self.stats["not_modified"] += 1
+                return None
+            response.raise_for_status()
+            body = await response.read()
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": body_hash(body),
+            }
+        if validators["hash"] == self.state.get(url, {}).get("hash"):
+            self.stats["unchanged"] += 1
+            self.state[url].update(etag=validators["etag"], last_modified=validators["last_modified"])
+            return None
+        self.stats["changed"] += 1
+        self.pending[url] = validators
+        return feedparser.parse(body)
+
+    def mark_processed(self, url):
+        """feed中的条目处理完后调用，之后内容不变的响应才会被跳过"""
+        if url in self.pending:
+            self.state[url] = self.pending.pop(url)
+
+    def save(self):
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def report(self):
+        """返回统计信息字符串，供各脚本在每轮结束时打印"""
+        return f"条件请求: 304 {self.stats['not_modified']} 次, 内容未变 {self.stats['unchanged']} 次, 有更新 {self.stats['changed']} 次"
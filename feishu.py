@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各脚本共用的飞书机器人消息发送
+
+- 复用一个keep-alive连接池，不再每条消息新建ClientSession
+- 同一个webhook的消息按 MIN_INTERVAL 间隔串行发送，多个数据源共用一个机器人时也不会触发飞书的频率限制；
+  异步和同步发送（如ingest_daemon中同步数据源所在的线程）共用同一份发送时刻表
+- HTTP 429/5xx 或飞书返回频率限制错误码时退避重试
+
+异步脚本:
+    import feishu
+    status, text = await feishu.send(webhook_url, message)
+
+同步脚本:
+    status, text = feishu.send_sync(webhook_url, message)
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import aiohttp
+import requests
+
+MIN_INTERVAL = 0.25  # 同一个webhook两条消息之间的最短间隔（秒），飞书自定义机器人限制为每秒5条
+RATE_LIMIT_CODES = {9499, 11232}  # 飞书返回的频率限制错误码
+
+
+def is_rate_limited(status, text):
+    if status == 429:
+        return True
+    try:
+        return json.loads(text).get("code") in RATE_LIMIT_CODES
+    except (ValueError, AttributeError):
+        return False
+
+
+class FeishuSender:
+    def __init__(self, min_interval=MIN_INTERVAL, timeout=30, max_retries=3, retry_backoff=1.0):
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session = None
+        self.loop = None
+        self.locks = {}
+        self.sync_session = requests.Session()
+        self.sync_locks = {}
+        self.sync_lock = threading.Lock()
+        # 每个webhook下一条消息最早的发送时间和统计，事件循环线程与其他线程共用，由state_lock保护
+        self.state_lock = threading.Lock()
+        self.next_send = {}
+        self.stats = {"sent": 0, "failed": 0, "retries": 0}
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.loop is not loop:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.loop = loop
+            self.locks = {}
+        return self.session
+
+    def _reserve_slot(self, webhook_url):
+        """预约该webhook的下一个发送时刻，返回需要等待的秒数；等待在锁外进行"""
+        with self.state_lock:
+            now = time.time()
+            slot = max(now, self.next_send.get(webhook_url, 0))
+            self.next_send[webhook_url] = slot + self.min_interval
+            return slot - now
+
+    def _count(self, name):
+        with self.state_lock:
+            self.stats[name] += 1
+
+    def _count_result(self, status, text):
+        self._count("sent" if status == 200 and not is_rate_limited(status, text) else "failed")
+
+    async def send(self, webhook_url, message):
+        """发送一条消息，返回 (HTTP状态码, 响应内容)"""
+        session = await self._get_session()
+        lock = self.locks.setdefault(webhook_url, asyncio.Lock())
+        async with lock:
+            for attempt in range(self.max_retries + 1):
+                wait_time = self._reserve_slot(webhook_url)
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+                try:
+                    async with session.post(webhook_url, json=message) as response:
+                        status, text = response.status, await response.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, text = 0, str(e)
+                if attempt < self.max_retries and (status == 0 or status >= 500 or is_rate_limited(status, text)):
+                    self._count("retries")
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                self._count_result(status, text)
+                return status, text
+
+    def send_sync(self, webhook_url, message):
+        """send的同步版本，可在普通线程中调用"""
+        with self.sync_lock:
+            lock = self.sync_locks.setdefault(webhook_url, threading.Lock())
+        with lock:
+            for attempt in range(self.max_retries + 1):
+                wait_time = self._reserve_slot(webhook_url)
+                if wait_time > 0:
+                    time.sleep(wait_time)
+                try:
+                    response = self.sync_session.post(webhook_url, json=message, timeout=self.timeout)
+                    status, text = response.status_code, response.text
+                except requests.RequestException as e:
+                    status, text = 0, str(e)
+                if attempt < self.max_retries and (status == 0 or status >= 500 or is_rate_limited(status, text)):
+                    self._count("retries")
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                self._count_result(status, text)
+                return status, text
+
+    def report(self):
+        """返回统计信息字符串"""
+        with self.state_lock:
+            stats = dict(self.stats)
+        return f"飞书推送: 成功 {stats['sent']} 条, 失败 {stats['failed']} 条, 重试 {stats['retries']} 次"
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+default_sender = None
+default_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """进程内共用的默认发送器，可在多个线程中调用"""
+    global default_sender
+    with default_sender_lock:
+        if default_sender is None:
+            default_sender = FeishuSender()
+        return default_sender
+
+
+async def send(webhook_url, message):
+    return await get_sender().send(webhook_url, message)
+
+
+def send_sync(webhook_url, message):
+    return get_sender().send_sync(webhook_url, message)
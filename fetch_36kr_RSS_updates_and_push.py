@@ -3,7 +3,9 @@ import aiohttp
 import feedparser
 import time
 from datetime import datetime
-import json
+from dedup_store import open_store
+import feishu
+from poll_scheduler import PollScheduler, entry_timestamp
 
 
 # RSSHub地址
@@ -17,21 +19,23 @@ webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/b2fc3cb6-75cd-4927-8
 
 # 用于存储已发送的文章ID
 sent_ids_file = "36kr_push/sent_ids.json"
+sent_ids_db = "36kr_push/sent_ids.db"
 
-# 加载已发送的文章ID
+# 自适应轮询：每个源的间隔在上下限之间按其更新频率调整
+poll_state_file = "36kr_push/poll_state.json"
+min_poll_interval = 120  # 秒
+max_poll_interval = 6 * 3600  # 秒
+
+# 加载已发送的文章ID（首次运行时自动从旧的json文件迁移）
 def load_sent_ids():
-    try:
-        with open(sent_ids_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_ids_db, legacy_file=sent_ids_file)
 
 # 保存已发送的文章ID
 def save_sent_ids(ids):
-    with open(sent_ids_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 sent_ids = load_sent_ids()
+scheduler = PollScheduler(poll_state_file, min_interval=min_poll_interval, max_interval=max_poll_interval, default_interval=3600)
 
 async def send_to_feishu(session, title, link, timestamp, source):
     message = {
@@ -52,11 +56,11 @@ async def send_to_feishu(session, title, link, timestamp, source):
     }
     
     try:
-        async with session.post(webhook_url, json=message) as response:
-            if response.status == 200:
-                print(f"{datetime.now()}: 成功发送: {title}")
-            else:
-                print(f"{datetime.now()}: 发送失败: {title}, 状态码: {response.status}")
+        status, _ = await feishu.send(webhook_url, message)
+        if status == 200:
+            print(f"{datetime.now()}: 成功发送: {title}")
+        else:
+            print(f"{datetime.now()}: 发送失败: {title}, 状态码: {status}")
     except Exception as e:
         print(f"{datetime.now()}: 发送时发生错误: {e}")
 
@@ -69,27 +73,36 @@ async def check_updates(session, url):
             
             source = url.split("/")[-1]  # 从URL中提取源名称
             
+            new_item_times = []
             for entry in feed.entries:
                 entry_id = entry.id if hasattr(entry, 'id') else entry.link
                 if entry_id not in sent_ids:
+                    new_item_times.append(entry_timestamp(entry))
                     await send_to_feishu(session, entry.title, entry.link, time.strftime("%Y-%m-%d %H:%M:%S", entry.published_parsed), source)
                     sent_ids.add(entry_id)
                     ## 休眠1秒，防止频繁发送
                     await asyncio.sleep(1)
+            scheduler.record(url, new_item_times)
                     
     except Exception as e:
         print(f"{datetime.now()}: 检查更新时发生错误: {e}")
+        scheduler.record_error(url)
 
 async def main():
     while True:
+        # 只轮询已到期的源，各源的间隔按其更新频率自适应
+        due_urls = scheduler.due(rsshub_urls)
         async with aiohttp.ClientSession() as session:
-            tasks = [check_updates(session, url) for url in rsshub_urls]
+            tasks = [check_updates(session, url) for url in due_urls]
             await asyncio.gather(*tasks)
         
         save_sent_ids(sent_ids)
+        scheduler.save()
         
-        print(f"{datetime.now()}: 休眠1小时...")
-        await asyncio.sleep(3600)  # 每1小时检查一次更新
+        sleep_time = scheduler.sleep_time(rsshub_urls)
+        print(f"{datetime.now()}: {scheduler.report(rsshub_urls)}")
+        print(f"{datetime.now()}: 休眠{sleep_time:.0f}秒...")
+        await asyncio.sleep(sleep_time)
 
 if __name__ == "__main__":
     try:
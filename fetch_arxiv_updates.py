@@ -2,15 +2,21 @@ import time
 import requests
 import feedparser
 import os
+from dedup_store import DedupStore
+import feishu
+from poll_scheduler import PollScheduler, entry_timestamp
+import ollama_client
+import translation_cache
+from translation_cache import cached_translate_sync
 
 # 请将此处的 URL 替换为您实际的飞书机器人 Webhook 地址
 FEISHU_WEBHOOK = "https://open.feishu.cn/open-apis/bot/v2/hook/8e718ac2-e3dd-4125-b11b-f981961c5135"
 
 # 用于存储已处理文章的文件路径
 PROCESSED_FILE = "arxiv_push/processed_ids.txt"
+PROCESSED_DB = "arxiv_push/processed_ids.db"
 
-# Ollama API配置
-OLLAMA_API_URL = "http://localhost:11434/api/chat"  # Ollama API地址
+# Ollama API配置（地址和并发数见 ollama_client.py）
 OLLAMA_MODEL = "qwen2.5:14b"  # Ollama中的模型名称
 
 # 代理配置
@@ -22,27 +28,24 @@ PROXIES = {
 # 请求超时设置（秒）
 REQUEST_TIMEOUT = 30
 
+# 自适应轮询：arXiv按工作日批量发布，间隔在1小时到12小时之间按新文章的到达间隔调整
+POLL_STATE_FILE = "arxiv_push/poll_state.json"
+ARXIV_FEED = "cs.SD+eess.AS"
+scheduler = PollScheduler(POLL_STATE_FILE, min_interval=3600, max_interval=12 * 3600, default_interval=6 * 3600)
+
 def load_processed_ids():
-    """从文件中加载已处理的文章 ID 集合"""
-    try:
-        with open(PROCESSED_FILE, "r") as f:
-            processed = {line.strip() for line in f if line.strip()}
-    except FileNotFoundError:
-        processed = set()
-    return processed
+    """打开已处理文章 ID 的去重库（首次运行时自动从旧的txt文件迁移）"""
+    return DedupStore(PROCESSED_DB, legacy_file=PROCESSED_FILE)
 
 def save_processed_ids(processed_ids):
-    """将处理过的文章 ID 保存到文件中"""
-    with open(PROCESSED_FILE, "w") as f:
-        for pid in processed_ids:
-            f.write(pid + "\n")
+    """提交新处理的文章 ID"""
+    processed_ids.commit()
 
 def send_to_feishu(message):
     """
     将消息发送到飞书机器人
     飞书机器人的消息格式为 JSON，下面采用 text 类型消息。
     """
-    headers = {"Content-Type": "application/json"}
     data = {
         "msg_type": "text",
         "content": {
@@ -50,9 +53,9 @@ def send_to_feishu(message):
         }
     }
     try:
-        response = requests.post(FEISHU_WEBHOOK, json=data, headers=headers)
-        if response.status_code != 200:
-            print("飞书通知失败，状态码：", response.status_code)
+        status, _ = feishu.send_sync(FEISHU_WEBHOOK, data)
+        if status != 200:
+            print("飞书通知失败，状态码：", status)
     except Exception as e:
         print("发送飞书消息异常：", e)
 
@@ -60,27 +63,14 @@ def translate_to_chinese(text):
     """
     使用 Ollama API 调用 Qwen2.5 模型将英文文本翻译为中文
     """
+    translate_prompt = "Translate the following text into Chinese, return only the translated text: "
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-        {"role": "user", "content": "Translate the following text into Chinese, return only the translated text: " + text}
+        {"role": "user", "content": translate_prompt + text}
     ]
     
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "stream": False
-    }
-    
     try:
-        response = requests.post(OLLAMA_API_URL, json=payload)
-        if response.status_code == 200:
-            result = response.json()
-            translated_text = result.get("message", {}).get("content", "").strip()
-            return translated_text
-        else:
-            error_text = response.text
-            print(f"Ollama API调用失败: {response.status_code}, {error_text}")
-            return "翻译失败"
+        return cached_translate_sync(text, OLLAMA_MODEL, translate_prompt, lambda: ollama_client.chat_sync(messages, model=OLLAMA_MODEL)).strip()
     except Exception as e:
         print(f"翻译异常: {e}")
         return "翻译失败"
@@ -107,11 +97,11 @@ def check_arxiv_updates():
         response = requests.get(url, timeout=REQUEST_TIMEOUT, proxies=PROXIES)
     except Exception as e:
         print("获取 arXiv 数据异常：", e)
+        scheduler.record_error(ARXIV_FEED)
         return
 
     feed = feedparser.parse(response.text)
     processed_ids = load_processed_ids()
-    new_processed = set(processed_ids)
     new_articles = []
 
     # 遍历返回的所有条目，如果文章 ID 未被处理，则视为新投稿
@@ -119,7 +109,8 @@ def check_arxiv_updates():
         article_id = entry.id  # 文章的唯一标识，通常为其网址，如 http://arxiv.org/abs/XXXX.XXXX
         if article_id not in processed_ids:
             new_articles.append(entry)
-            new_processed.add(article_id)
+            processed_ids.add(article_id)
+    scheduler.record(ARXIV_FEED, [entry_timestamp(entry) for entry in new_articles])
 
     # 对于每个新文章，通过飞书机器人发送通知
     for article in new_articles:
@@ -149,17 +140,23 @@ def check_arxiv_updates():
         send_to_feishu(message)
 
     # 更新保存处理过的文章 ID
-    save_processed_ids(new_processed)
+    save_processed_ids(processed_ids)
+    processed_ids.close()
+    print(ollama_client.get_client().report())
+    print(translation_cache.report())
 
 def main():
     """
-    主循环，每隔一小时检查一次 arXiv 更新
+    主循环，按 arXiv 的实际更新频率自适应地检查更新
     """
     while True:
-        print("开始检查 arXiv 更新……")
-        check_arxiv_updates()
-        print("检查完成，休眠6小时。")
-        time.sleep(3600 * 6)  # 每隔6小时执行一次
+        if scheduler.due([ARXIV_FEED]):
+            print("开始检查 arXiv 更新……")
+            check_arxiv_updates()
+            scheduler.save()
+        sleep_time = scheduler.sleep_time([ARXIV_FEED])
+        print(f"检查完成，休眠{sleep_time / 3600:.1f}小时。")
+        time.sleep(sleep_time)
 
 if __name__ == "__main__":
     main()
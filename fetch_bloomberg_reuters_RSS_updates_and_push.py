@@ -1,9 +1,14 @@
 import asyncio
 import aiohttp
-import feedparser
 import time
 from datetime import datetime
-import json
+from dedup_store import open_store
+import feishu
+from feed_poller import ConditionalFeedFetcher
+from poll_scheduler import PollScheduler, entry_timestamp
+import ollama_client
+import translation_cache
+from translation_cache import cached_translate
 
 # Bloomberg RSSHub地址
 rsshub_urls = {
@@ -23,50 +28,52 @@ webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/4151bf5e-8b82-4e9a-8
 
 # 用于存储已发送的文章ID
 sent_ids_file = "bloomberg_reuters_push/sent_ids.json"
+sent_ids_db = "bloomberg_reuters_push/sent_ids.db"
 
-# Ollama API地址
-ollama_api_url = "http://localhost:11434/api/chat"
+# 条件请求状态（ETag / Last-Modified / 内容哈希）
+feed_state_file = "bloomberg_reuters_push/feed_state.json"
+# 所有路由都在同一个RSSHub上，限制对它的并发连接数
+max_connections_per_host = 4
+request_timeout = 60  # 秒
 
-# 加载已发送的文章ID
+# 自适应轮询：每个路由的间隔在上下限之间按其更新频率调整
+poll_state_file = "bloomberg_reuters_push/poll_state.json"
+min_poll_interval = 300  # 秒
+max_poll_interval = 6 * 3600  # 秒
+
+# Ollama模型（地址和并发数见 ollama_client.py）
+ollama_model = "qwen2.5:14b"
+
+# 加载已发送的文章ID（首次运行时自动从旧的json文件迁移）
 def load_sent_ids():
-    try:
-        with open(sent_ids_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_ids_db, legacy_file=sent_ids_file)
 
 # 保存已发送的文章ID
 def save_sent_ids(ids):
-    with open(sent_ids_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 sent_ids = load_sent_ids()
+feed_fetcher = ConditionalFeedFetcher(feed_state_file)
+scheduler = PollScheduler(poll_state_file, min_interval=min_poll_interval, max_interval=max_poll_interval, default_interval=3600)
 
-async def translate_with_ollama(session, text):
+async def translate_with_ollama(text):
     """使用Ollama API翻译文本"""
-    payload = {
-        "model": "qwen2.5:14b",
-        "messages": [
-            {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-            {"role": "user", "content": f"Translate this into Chinese, return only the translated text: {text}"}
-        ],
-        "stream": False
-    }
+    translate_prompt = "Translate this into Chinese, return only the translated text: "
+    messages = [
+        {"role": "system", "content": "You are Qwen, a great reader and translator!"},
+        {"role": "user", "content": translate_prompt + text}
+    ]
     
     try:
-        async with session.post(ollama_api_url, json=payload) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result["message"]["content"].strip()
-            else:
-                print(f"{datetime.now()}: Ollama API请求失败: 状态码={response.status}, URL={ollama_api_url}")
-                return f"[翻译失败] {text}"
+        # 同一条新闻常出现在多个路由中，译文直接取缓存
+        translated = await cached_translate(text, ollama_model, translate_prompt, lambda: ollama_client.chat(messages, model=ollama_model))
+        return translated.strip()
     except Exception as e:
-        print(f"{datetime.now()}: Ollama API请求错误: {str(e)}, URL={ollama_api_url}")
+        print(f"{datetime.now()}: Ollama API请求错误: {str(e)}")
         return f"[翻译失败] {text}"
 
 async def send_to_feishu(session, title, link, timestamp, source):
-    translated_title = await translate_with_ollama(session, title)
+    translated_title = await translate_with_ollama(title)
     message = {
         "msg_type": "post",
         "content": {
@@ -86,47 +93,73 @@ async def send_to_feishu(session, title, link, timestamp, source):
     }
     
     try:
-        async with session.post(webhook_url, json=message) as response:
-            if response.status == 200:
-                print(f"{datetime.now()}: 成功发送: {title}")
-            else:
-                print(f"{datetime.now()}: 发送失败: {title}, 状态码: {response.status}")
+        status, _ = await feishu.send(webhook_url, message)
+        if status == 200:
+            print(f"{datetime.now()}: 成功发送: {title}")
+        else:
+            print(f"{datetime.now()}: 发送失败: {title}, 状态码: {status}")
     except Exception as e:
         print(f"{datetime.now()}: 发送时发生错误: {e}")
 
-async def check_updates(session, source, url):
+async def fetch_feed(session, source, url):
+    """抓取单个路由，内容未变化或请求失败时返回None"""
+    try:
+        feed = await feed_fetcher.fetch(session, url)
+    except Exception as e:
+        print(f"{datetime.now()}: 获取{source}资讯时发生错误: {e}")
+        scheduler.record_error(source)
+        return None
+    if feed is None:
+        scheduler.record(source, [])
+    return feed
+
+async def check_updates(session, source, url, feed):
     global sent_ids
     try:
-        async with session.get(url) as response:
-            content = await response.text()
-            feed = feedparser.parse(content)
-            
-            for entry in feed.entries:
-                entry_id = entry.link
-                # print("----------------------------------------------------------------------------------------------------")
-                # for key, value in entry.items():
-                #     print(f"{key}: {value}")
-                if entry_id not in sent_ids:
-                    await send_to_feishu(session, entry.title, entry.link, time.strftime("%Y-%m-%d %H:%M:%S", entry.published_parsed), source)
-                    sent_ids.add(entry_id)
-                    await asyncio.sleep(1)  # 休眠1秒，防止频繁发送
+        new_item_times = []
+        for entry in feed.entries:
+            entry_id = entry.link
+            # print("----------------------------------------------------------------------------------------------------")
+            # for key, value in entry.items():
+            #     print(f"{key}: {value}")
+            if entry_id not in sent_ids:
+                new_item_times.append(entry_timestamp(entry))
+                await send_to_feishu(session, entry.title, entry.link, time.strftime("%Y-%m-%d %H:%M:%S", entry.published_parsed), source)
+                sent_ids.add(entry_id)
+                await asyncio.sleep(1)  # 休眠1秒，防止频繁发送
+        feed_fetcher.mark_processed(url)
+        scheduler.record(source, new_item_times)
                     
     except Exception as e:
         print(f"{datetime.now()}: 检查更新时发生错误: {e}")
+        scheduler.record_error(source)
 
 async def main():
     while True:
-        async with aiohttp.ClientSession() as session:
-            for source, url in rsshub_urls.items():
-                print(f"{datetime.now()}: 开始检查{source}资讯...")
-                await check_updates(session, source, url)
-            # tasks = [check_updates(session, source, url) for (source, url) in rsshub_urls.items()]
-            # await asyncio.gather(*tasks)
+        connector = aiohttp.TCPConnector(limit_per_host=max_connections_per_host)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=request_timeout)) as session:
+            # 已到期的路由并发抓取，未变化的路由只消耗一次304；各路由的间隔按其更新频率自适应
+            due_sources = scheduler.due(rsshub_urls)
+            print(f"{datetime.now()}: 开始检查{len(due_sources)}个路由...")
+            feeds = await asyncio.gather(*(fetch_feed(session, source, rsshub_urls[source]) for source in due_sources))
+            # 推送按路由顺序逐条进行，同一条新闻出现在多个路由中时只推送一次
+            for source, feed in zip(due_sources, feeds):
+                if feed is None:
+                    continue
+                print(f"{datetime.now()}: {source}资讯有更新，开始处理...")
+                await check_updates(session, source, rsshub_urls[source], feed)
         
         save_sent_ids(sent_ids)
+        feed_fetcher.save()
+        scheduler.save()
+        print(f"{datetime.now()}: {feed_fetcher.report()}")
+        print(ollama_client.get_client().report())
+        print(translation_cache.report())
         
-        print(f"{datetime.now()}: 休眠1小时...")
-        await asyncio.sleep(3600)  # 每1小时检查一次更新
+        sleep_time = scheduler.sleep_time(rsshub_urls)
+        print(f"{datetime.now()}: {scheduler.report(rsshub_urls)}")
+        print(f"{datetime.now()}: 休眠{sleep_time:.0f}秒...")
+        await asyncio.sleep(sleep_time)
 
 if __name__ == "__main__":
     try:
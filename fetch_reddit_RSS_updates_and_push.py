@@ -1,12 +1,16 @@
 import asyncio
-import json
 import time
-import random
 from datetime import datetime
-import aiohttp
-from transformers import AutoModelForCausalLM, AutoTokenizer
 import feedparser
 import requests
+from dedup_store import open_store
+import feishu
+from local_llm import LocalLLMClient
+from poll_scheduler import PollScheduler, entry_timestamp
+import translation_cache
+from translation_cache import cached_translate
+
+startup_time = time.time()  # 用于统计启动到首轮轮询完成的耗时
 
 # --- 配置 ---
 webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/c1e4eee2-d642-49bc-9916-5b3e9fa79502"
@@ -19,44 +23,36 @@ reddit_rss_urls = [
     "https://www.reddit.com/r/options/.rss"
 ]
 sent_posts_file = "reddit_push/sent_posts.json"
+sent_posts_db = "reddit_push/sent_posts.db"
 model_name = "Qwen/Qwen2.5-7B-Instruct-AWQ"
-cache_dir = '/home/kemove/.cache/huggingface/hub'
+llm_server_url = "http://127.0.0.1:8765"  # 本地推理服务地址（local_llm_server.py），也可以是 unix:///tmp/local_llm.sock
+poll_state_file = "reddit_push/poll_state.json"  # 自适应轮询状态
+min_poll_interval = 600  # 单个子版块的最短轮询间隔（秒）
+max_poll_interval = 4 * 3600  # 单个子版块的最长轮询间隔（秒）
 # --- 配置结束 ---
 
 # 全局变量
 sent_post_ids = set()
+scheduler = PollScheduler(poll_state_file, min_interval=min_poll_interval, max_interval=max_poll_interval, default_interval=2500)
 
-# 加载qwen模型及分词器
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype="auto",
-    device_map="auto",
-    cache_dir=cache_dir
-)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+# 模型由本地推理服务统一加载，这里只创建客户端
+generator = LocalLLMClient(llm_server_url)
 
 def load_sent_post_ids():
-    try:
-        with open(sent_posts_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_posts_db, legacy_file=sent_posts_file)
 
 def save_sent_post_ids(ids):
-    with open(sent_posts_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 async def send_to_feishu(post_title, post_content, post_url, author, timestamp):
     formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", timestamp)
+    translate_prompt = "Translate this Reddit post title into Chinese, return only the translated text: Title: "
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-        {"role": "user", "content": "Translate this Reddit post title into Chinese, return only the translated text: Title: " + post_title}
+        {"role": "user", "content": translate_prompt + post_title}
     ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-    generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-    response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    # 相同标题直接使用缓存的译文
+    response = await cached_translate(post_title, model_name, translate_prompt, lambda: generator.generate(messages, max_new_tokens=512))
     translated_text = response.strip()
 
     message = {
@@ -75,27 +71,37 @@ async def send_to_feishu(post_title, post_content, post_url, author, timestamp):
             }
         }
     }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送Reddit帖子到飞书，帖子标题: {post_title}, 帖子链接: {post_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送Reddit帖子到飞书，帖子标题: {post_title}, 帖子链接: {post_url}, 飞书响应状态码: {status}, 响应内容: {text}")
 
 def fetch_rss_feed(url):
     feeds = feedparser.parse(url)
     return feeds
 
+async def send_new_post(post_id, post_title, post_content, post_url, post_author, post_timestamp):
+    await send_to_feishu(post_title, post_content, post_url, post_author, post_timestamp)
+    sent_post_ids.add(post_id)
+
 async def process_reddit_rss():
     global sent_post_ids
     
     try:
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 正在抓取 Reddit RSS更新...")
         
-        for reddit_rss_url in reddit_rss_urls:
-            # 获取RSS更新
-            entries = fetch_rss_feed(reddit_rss_url).entries
-            
-            for entry in entries:
+        # 只抓取已到期的子版块（feedparser是同步接口，放到线程中并发抓取）
+        due_urls = scheduler.due(reddit_rss_urls)
+        feeds = await asyncio.gather(*(asyncio.to_thread(fetch_rss_feed, reddit_rss_url) for reddit_rss_url in due_urls))
+
+        tasks = []
+        queued_ids = set()  # 同一帖子可能出现在多个子版块
+        for reddit_rss_url, feed in zip(due_urls, feeds):
+            if feed.get("bozo") and not feed.entries:
+                print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 抓取 {reddit_rss_url} 失败: {feed.get('bozo_exception')}")
+                scheduler.record_error(reddit_rss_url)
+                continue
+            new_post_times = []
+            for entry in feed.entries:
                 post_title = entry.title
                 post_content = entry.summary
                 post_url = entry.link
@@ -103,9 +109,16 @@ async def process_reddit_rss():
                 post_timestamp = entry.published_parsed
                 post_id = entry.id
 
-                if post_id not in sent_post_ids:
-                    await send_to_feishu(post_title, post_content, post_url, post_author, post_timestamp)
-                    sent_post_ids.add(post_id)
+                if post_id not in sent_post_ids and post_id not in queued_ids:
+                    queued_ids.add(post_id)
+                    new_post_times.append(entry_timestamp(entry))
+                    tasks.append(send_new_post(post_id, post_title, post_content, post_url, post_author, post_timestamp))
+            scheduler.record(reddit_rss_url, new_post_times)
+
+        # 所有新帖子同时提交，标题翻译合并成批次推理
+        await asyncio.gather(*tasks)
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {generator.report()}")
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {translation_cache.report()}")
                 
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 完成 Reddit RSS处理...")
 
@@ -113,15 +126,21 @@ async def process_reddit_rss():
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 处理Reddit RSS时发生错误: {e}")
 
 async def main():
-    global sent_post_ids
+    global sent_post_ids, startup_time
     sent_post_ids = load_sent_post_ids()
 
     while True:
         await process_reddit_rss()
+        if startup_time is not None:
+            # 模型由推理服务按需加载，没有新条目的轮次不需要等待模型
+            print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 启动到首轮轮询完成用时 {time.time() - startup_time:.1f} 秒")
+            startup_time = None
         save_sent_post_ids(sent_post_ids)
+        scheduler.save()
 
-        # 在1-2小时之间随机选择睡眠时间
-        sleep_time = random.uniform(1800, 3200)  # 3600秒 = 1小时, 7200秒 = 2小时
+        # 睡到下一个子版块到期，各子版块的间隔按其发帖频率自适应
+        sleep_time = scheduler.sleep_time(reddit_rss_urls)
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {scheduler.report(reddit_rss_urls)}")
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 睡眠 {sleep_time:.2f} 秒...")
         await asyncio.sleep(sleep_time)
 
@@ -1,13 +1,17 @@
 import asyncio
-import json
 import time
 import random
 from datetime import datetime
 from twikit import Client
-import aiohttp
 from dateutil import parser
 from pytz import timezone
 import os
+from dedup_store import open_store
+import feishu
+import lang_detect
+import ollama_client
+import translation_cache
+from translation_cache import cached_translate
 
 # --- 配置 ---
 webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/b5fa30f9-e0d1-42d5-88ba-a943030992c6"
@@ -27,7 +31,7 @@ target_usernames = ["tychozzz", "caolei1", "Vson0903",
                     "dacefupan", "__Inty__", "andy_sharks", "DogutOscar", "x001fx", "Hoyooyoo", 
                     "hongsv11", "ShanghaoJin", "yiguxia", "yamato812536"]
 sent_tweets_file = "twikit_push/sent_tweets.json"
-ollama_api_url = "http://localhost:11434/api/chat"  # Ollama API地址
+sent_tweets_db = "twikit_push/sent_tweets.db"
 ollama_model = "qwen2.5:14b"  # Ollama中的模型名称
 num_parts = 1  # 可以改为4或其他值，用于指定 target_usernames 分成的份数
 # --- 配置结束 ---
@@ -48,51 +52,41 @@ def split_list(lst, num_parts):
     return parts
 
 def load_sent_tweet_ids():
-    try:
-        with open(sent_tweets_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_tweets_db, legacy_file=sent_tweets_file)
 
 def save_sent_tweet_ids(ids):
-    with open(sent_tweets_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 async def query_ollama(messages):
     """调用Ollama API进行文本生成"""
-    payload = {
-        "model": ollama_model,
-        "messages": messages,
-        "stream": False
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(ollama_api_url, json=payload) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result["message"]["content"]
-            else:
-                error_text = await response.text()
-                raise Exception(f"Ollama API调用失败: {response.status}, {error_text}")
+    return await ollama_client.chat(messages, model=ollama_model)
 
-async def send_to_feishu(tweet_text, tweet_url, author, formatted_time):
-    # 检查是否为英文或其他非中文语言
+async def is_non_chinese(tweet_text):
+    """先按字符类别本地判断，只有无法确定的混合文本才调用模型"""
+    language = lang_detect.classify_language(tweet_text)
+    if language is not None:
+        return language == lang_detect.NON_CHINESE
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
         {"role": "user", "content": "Is this message in English or other non-Chinese language? Return only yes or no, discard any other text: " + tweet_text}
     ]
     
-    response = await query_ollama(messages)
-    response = ''.join(filter(str.isalpha, response))
-    
-    if response.lower() == "yes":
+    # 流式读取，拿到第一个词（yes/no）就停止生成
+    response = await ollama_client.classify(messages, model=ollama_model)
+    return response == "yes"
+
+async def send_to_feishu(tweet_text, tweet_url, author, formatted_time):
+    # 检查是否为英文或其他非中文语言
+    if await is_non_chinese(tweet_text):
         # 翻译推文
+        translate_prompt = "Translate this tweet into Chinese, return only the translated text: "
         messages = [
             {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-            {"role": "user", "content": "Translate this tweet into Chinese, return only the translated text: " + tweet_text}
+            {"role": "user", "content": translate_prompt + tweet_text}
         ]
         
-        translated_text = await query_ollama(messages)
+        # 相同原文（例如多个账号转推同一条推文）直接使用缓存的译文
+        translated_text = await cached_translate(tweet_text, ollama_model, translate_prompt, lambda: query_ollama(messages))
 
         message = {
             "msg_type": "post",
@@ -127,11 +121,9 @@ async def send_to_feishu(tweet_text, tweet_url, author, formatted_time):
                 }                
             }
         }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {status}, 响应内容: {text}")
 
 async def process_twitter_user_updates(client, username):
     global sent_tweet_ids
@@ -195,6 +187,9 @@ async def main():
             await asyncio.sleep(random.randint(30, 90))
 
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 完成第 {current_part_index} 部分的用户处理...")
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {lang_detect.report()}")
+        print(ollama_client.get_client().report())
+        print(translation_cache.report())
         save_sent_tweet_ids(sent_tweet_ids)
         cycle_count += 1
 
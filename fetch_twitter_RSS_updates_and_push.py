@@ -1,13 +1,18 @@
 import asyncio
-import json
 import time
 import random
 from datetime import datetime
-import aiohttp
-from transformers import AutoModelForCausalLM, AutoTokenizer
 from selenium import webdriver
 import feedparser
 import requests
+from dedup_store import open_store
+import feishu
+from local_llm import LocalLLMClient
+import translation_cache
+from translation_cache import cached_translate
+import lang_detect
+
+startup_time = time.time()  # 用于统计启动到首轮轮询完成的耗时
 
 # --- 配置 ---
 # webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/f97028b8-d693-4c23-989b-639a68807e2d"
@@ -27,56 +32,48 @@ target_usernames = ["myfxtrader", "tzwqbest", "GlobalMoneyAI", "AsiaFinance", "O
                     "yuyy614893671", "JamesLt196801", "DrJStrategy", "z0072024", "YeMuXinTu", "Starlink", "IvyUnclestock", "yuexiaoyu111", "Jukanlosreve", "lianyanshe", "hiCaptainZ", "PallasCatFin", ]
 target_urls = {username: f"http://localhost:1200/twitter/user/{username}" for username in target_usernames}
 sent_tweets_file = "twitter_push/sent_tweets.json"
+sent_tweets_db = "twitter_push/sent_tweets.db"
 model_name = "Qwen/Qwen2.5-7B-Instruct-AWQ"
-cache_dir = '/home/kemove/.cache/huggingface/hub'
+llm_server_url = "http://127.0.0.1:8765"  # 本地推理服务地址（local_llm_server.py），也可以是 unix:///tmp/local_llm.sock
+max_concurrent_fetches = 4  # 同时抓取RSS的用户数
 # --- 配置结束 ---
 
 # 全局变量
 sent_tweet_ids = set()
 
-# 加载qwen模型及分词器
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype="auto",
-    device_map="auto",
-    cache_dir=cache_dir
-)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+# 模型由本地推理服务统一加载，这里只创建客户端
+generator = LocalLLMClient(llm_server_url)
 
 def load_sent_tweet_ids():
-    try:
-        with open(sent_tweets_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_tweets_db, legacy_file=sent_tweets_file)
 
 def save_sent_tweet_ids(ids):
-    with open(sent_tweets_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
-async def send_to_feishu(tweet_text, tweet_url, username, author, timestamp):
-    formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", timestamp)
+async def is_non_chinese(tweet_text):
+    """先按字符类别本地判断，只有无法确定的混合文本才调用模型"""
+    language = lang_detect.classify_language(tweet_text)
+    if language is not None:
+        return language == lang_detect.NON_CHINESE
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
         {"role": "user", "content": "Is this message in English or other non-Chinese language? Return only yes or no, discard any other text: " + tweet_text}
     ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-    generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-    response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    response = await generator.generate(messages, max_new_tokens=16)
     ##只保留英文文字
     response = ''.join(filter(str.isalpha, response))
-    if response.lower() == "yes":
+    return response.lower() == "yes"
+
+async def send_to_feishu(tweet_text, tweet_url, username, author, timestamp):
+    formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", timestamp)
+    if await is_non_chinese(tweet_text):
+        translate_prompt = "Translate this tweet into Chinese, return only the translated text: "
         messages = [
             {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-            {"role": "user", "content": "Translate this tweet into Chinese, return only the translated text: " + tweet_text}
+            {"role": "user", "content": translate_prompt + tweet_text}
         ]
-        text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-        generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-        generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-        response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        # 相同原文（例如多个账号转推同一条推文）直接使用缓存的译文
+        response = await cached_translate(tweet_text, model_name, translate_prompt, lambda: generator.generate(messages, max_new_tokens=512))
         translated_text = response.strip()
 
         message = {
@@ -112,27 +109,31 @@ async def send_to_feishu(tweet_text, tweet_url, username, author, timestamp):
                 }                
             }
         }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {status}, 响应内容: {text}")
 
 def fetch_rss_feed(url):
     response = requests.get(url)
     return feedparser.parse(response.content)
 
-async def process_twitter_rss_for_user(username, url):
+async def send_new_tweet(tweet_id, tweet_text, tweet_url, username, tweet_author, tweet_timestamp):
+    await send_to_feishu(tweet_text, tweet_url, username, tweet_author, tweet_timestamp)
+    sent_tweet_ids.add(tweet_id)
+
+async def process_twitter_rss_for_user(username, url, semaphore):
     global sent_tweet_ids
     
     try:
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 正在抓取 {username} 的RSS更新...")
         
-        # 获取该用户的RSS更新
-        entries = fetch_rss_feed(url)["entries"]
+        # 获取该用户的RSS更新（信号量只限制抓取，翻译在批量推理队列中排队）
+        async with semaphore:
+            entries = (await asyncio.to_thread(fetch_rss_feed, url))["entries"]
     
         # import ipdb; ipdb.set_trace()
         
+        tasks = []
         for entry in entries:
             tweet_text = entry.title
             tweet_url = entry.link
@@ -141,8 +142,10 @@ async def process_twitter_rss_for_user(username, url):
             tweet_id = username + tweet_url.split("/")[-1]  # 使用用户名+推文ID作为唯一标识符
 
             if tweet_id not in sent_tweet_ids:
-                await send_to_feishu(tweet_text, tweet_url, username, tweet_author, tweet_timestamp)
-                sent_tweet_ids.add(tweet_id)
+                tasks.append(send_new_tweet(tweet_id, tweet_text, tweet_url, username, tweet_author, tweet_timestamp))
+
+        # 新推文同时提交，与其他用户的推文合并成批次推理
+        await asyncio.gather(*tasks)
                 
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 完成 {username} 的RSS处理...")
 
@@ -150,25 +153,28 @@ async def process_twitter_rss_for_user(username, url):
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 处理 {username} 时发生错误: {e}，跳过该用户。")
 
 async def process_twitter_rss():
-    semaphore = asyncio.Semaphore(1)  # 限制并发数为2
-
-    async def process_with_semaphore(username, url):
-        async with semaphore:
-            await process_twitter_rss_for_user(username, url)
+    semaphore = asyncio.Semaphore(max_concurrent_fetches)
 
     tasks = []
     for username, url in target_urls.items():
-        tasks.append(process_with_semaphore(username, url))
+        tasks.append(process_twitter_rss_for_user(username, url, semaphore))
 
-    # 并发执行多个任务，但最多同时执行2个
+    # 并发执行多个任务，同时抓取的用户数不超过max_concurrent_fetches
     await asyncio.gather(*tasks)
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {generator.report()}")
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {translation_cache.report()}")
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {lang_detect.report()}")
 
 async def main():
-    global sent_tweet_ids
+    global sent_tweet_ids, startup_time
     sent_tweet_ids = load_sent_tweet_ids()
 
     while True:
         await process_twitter_rss()
+        if startup_time is not None:
+            # 模型由推理服务按需加载，没有新条目的轮次不需要等待模型
+            print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 启动到首轮轮询完成用时 {time.time() - startup_time:.1f} 秒")
+            startup_time = None
         save_sent_tweet_ids(sent_tweet_ids)
 
         # 在1-2小时之间随机选择睡眠时间
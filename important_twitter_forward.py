@@ -1,10 +1,15 @@
 import asyncio
-import json
+import time
 from datetime import datetime, timedelta
 from playwright.async_api import async_playwright
-import aiohttp
-from transformers import AutoModelForCausalLM, AutoTokenizer
 import random
+from dedup_store import open_store
+import feishu
+from local_llm import LocalLLMClient
+import translation_cache
+from translation_cache import cached_translate
+
+startup_time = time.time()  # 用于统计启动到轮询完成的耗时
 
 # 飞书机器人Webhook地址
 webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/b5fa30f9-e0d1-42d5-88ba-a943030992c6"
@@ -36,52 +41,36 @@ X_PASSWORD = "iamyour88"
 
 # 已发送推文ID存储文件
 sent_tweets_file = "twitter_push/sent_tweets.json"
+sent_tweets_db = "twitter_push/sent_tweets.db"
 
 # 登录状态变量
 last_login_time = None
 
 # 初始化已发送推文ID集合
 def load_sent_tweet_ids():
-    try:
-        with open(sent_tweets_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_tweets_db, legacy_file=sent_tweets_file)
 
 def save_sent_tweet_ids(ids):
-    with open(sent_tweets_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 sent_tweet_ids = load_sent_tweet_ids()
 
-# 加载qwen模型及分词器，这里假设模型名为 "Qwen/Qwen2.5-7B-Instruct-AWQ"，需根据实际情况调整
+# 模型由本地推理服务统一加载，这里只创建客户端；model_name需与服务加载的模型一致（用作翻译缓存的键）
 model_name = "Qwen/Qwen2.5-7B-Instruct-AWQ"
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    # torch_dtype=torch.float16,
-    torch_dtype="auto",
-    device_map="auto",
-    cache_dir='/home/kemove/.cache/huggingface/hub'
-)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+llm_server_url = "http://127.0.0.1:8765"  # 本地推理服务地址（local_llm_server.py），也可以是 unix:///tmp/local_llm.sock
+generator = LocalLLMClient(llm_server_url)
 
 async def send_to_feishu(tweet_text, tweet_url, username):
     # # 翻译推文内容为中文
     # text = f"Translate this tweet into Chinese: {tweet_text}"
     # model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
+    translate_prompt = "Translate this tweet into Chinese, return only the translated text, discard all other texts: "
     messages = [
         {"role": "system", "content": "You are Qwen, you are a great reader and translator!"},
-        {"role": "user", "content": "Translate this tweet into Chinese, return only the translated text, discard all other texts: " + tweet_text}
+        {"role": "user", "content": translate_prompt + tweet_text}
     ]
-    text = tokenizer.apply_chat_template(
-        messages,
-        tokenize=False,
-        add_generation_prompt=True
-    )
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-    generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-    response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    # 相同原文（例如多个账号转推同一条推文）直接使用缓存的译文
+    response = await cached_translate(tweet_text, model_name, translate_prompt, lambda: generator.generate(messages, max_new_tokens=512))
     translated_text = response.strip()
 
     message = {
@@ -100,11 +89,18 @@ async def send_to_feishu(tweet_text, tweet_url, username):
             }
         }
     }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {status}, 响应内容: {text}")
+
+async def send_new_tweet(tweet_text, tweet_url, tweet_id, username):
+    try:
+        await send_to_feishu(tweet_text, tweet_url, username)
+        sent_tweet_ids.add(tweet_id)
+        save_sent_tweet_ids(sent_tweet_ids)
+    except Exception as e:
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{current_time} 发生错误: {e}")
 
 async def login_if_needed(page):
     global last_login_time
@@ -166,16 +162,21 @@ async def main():
         #从target_urls.items()中随机取40个
         random_urls = random.sample(list(target_urls.items()), 40)
         # random_urls = random.sample(list(target_urls.items()), 1)
+        pending = []
         for username, url in random_urls:
             try:
                 new_tweets = await get_tweets(page, username, url)
+                # 翻译和推送在后台进行，与后续用户的推文合并成批次推理
                 for tweet_text, tweet_url, tweet_id in new_tweets:
-                    await send_to_feishu(tweet_text, tweet_url, username)
-                    sent_tweet_ids.add(tweet_id)
-                    save_sent_tweet_ids(sent_tweet_ids)
+                    pending.append(asyncio.create_task(send_new_tweet(tweet_text, tweet_url, tweet_id, username)))
             except Exception as e:
                 current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 print(f"{current_time} 发生错误: {e}")
+        await asyncio.gather(*pending)
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{current_time} 启动到轮询完成用时 {time.time() - startup_time:.1f} 秒")
+        print(f"{current_time} {generator.report()}")
+        print(f"{current_time} {translation_cache.report()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
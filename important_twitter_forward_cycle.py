@@ -1,10 +1,15 @@
 import asyncio
-import json
+import time
 from datetime import datetime, timedelta
-from playwright.async_api import async_playwright
-import aiohttp
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from browser_pool import BrowserPool
 import random
+from dedup_store import open_store
+import feishu
+from local_llm import LocalLLMClient
+import translation_cache
+from translation_cache import cached_translate
+
+startup_time = time.time()  # 用于统计启动到首轮轮询完成的耗时
 
 # --- 配置 ---
 webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/b5fa30f9-e0d1-42d5-88ba-a943030992c6"
@@ -25,50 +30,40 @@ X_USERNAME = "iamyourfather20241220@outlook.com"
 X_USERID = "pika95083640764"
 X_PASSWORD = "iamyour88"
 sent_tweets_file = "twitter_push/sent_tweets.json"
+sent_tweets_db = "twitter_push/sent_tweets.db"
 model_name = "Qwen/Qwen2.5-7B-Instruct-AWQ"
-cache_dir = '/home/kemove/.cache/huggingface/hub'
+llm_server_url = "http://127.0.0.1:8765"  # 本地推理服务地址（local_llm_server.py），也可以是 unix:///tmp/local_llm.sock
 # --- 配置结束 ---
 
 # 全局变量
 last_login_time = None
+logged_in_page = None
 sent_tweet_ids = set()
 url_index = 0
-# 加载qwen模型及分词器
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    # torch_dtype=torch.float16,
-    torch_dtype="auto",
-    device_map="auto",
-    cache_dir=cache_dir
-)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+# 模型由本地推理服务统一加载，这里只创建客户端
+generator = LocalLLMClient(llm_server_url)
+# 浏览器在各轮之间保持运行，登录状态保存在同一个上下文中
+browser_pool = BrowserPool(size=1, browser_type="firefox")
 
 
 
 
 def load_sent_tweet_ids():
-    try:
-        with open(sent_tweets_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_tweets_db, legacy_file=sent_tweets_file)
 
 
 def save_sent_tweet_ids(ids):
-    with open(sent_tweets_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 
 async def send_to_feishu(tweet_text, tweet_url, username):
+    translate_prompt = "Translate this tweet into Chinese, return only the translated text: "
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-        {"role": "user", "content": "Translate this tweet into Chinese, return only the translated text: " + tweet_text}
+        {"role": "user", "content": translate_prompt + tweet_text}
     ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-    generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-    response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    # 相同原文（例如多个账号转推同一条推文）直接使用缓存的译文
+    response = await cached_translate(tweet_text, model_name, translate_prompt, lambda: generator.generate(messages, max_new_tokens=512))
     translated_text = response.strip()
 
     message = {
@@ -87,15 +82,27 @@ async def send_to_feishu(tweet_text, tweet_url, username):
             }
         }
     }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {status}, 响应内容: {text}")
+
+
+async def send_new_tweet(tweet_text, tweet_url, tweet_id, username):
+    try:
+        await send_to_feishu(tweet_text, tweet_url, username)
+        sent_tweet_ids.add(tweet_id)
+        save_sent_tweet_ids(sent_tweet_ids)
+    except Exception as e:
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{current_time} 发生错误: {e}")
 
 
 async def login_if_needed(page):
-    global last_login_time
+    global last_login_time, logged_in_page
+    if page is logged_in_page:
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{current_time} 浏览器会话已登录，无需重新登录。")
+        return
     if last_login_time and datetime.now() - last_login_time < timedelta(minutes=5):
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         print(f"{current_time} 上次登录未超过5分钟，无需重新登录。")
@@ -116,6 +123,7 @@ async def login_if_needed(page):
 
     await asyncio.sleep(10)  # 等待页面加载
     last_login_time = datetime.now()
+    logged_in_page = page
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"{current_time} 登录成功！")
 
@@ -143,38 +151,47 @@ async def get_tweets(page, username, url):
 
 
 async def main():
-    global url_index
+    global url_index, startup_time
     
-    while True:
-        async with async_playwright() as p:
-            browser = await p.firefox.launch(headless=True)
-            page = await browser.new_page()
-
-            await login_if_needed(page)
-
-            start_index = url_index
-            end_index = min(url_index + 40, len(target_urls))
-            urls_to_process = list(target_urls.items())[start_index:end_index]
-
-            for username, url in urls_to_process:
-                try:
-                    new_tweets = await get_tweets(page, username, url)
-                    for tweet_text, tweet_url, tweet_id in new_tweets:
-                        await send_to_feishu(tweet_text, tweet_url, username)
-                        sent_tweet_ids.add(tweet_id)
-                        save_sent_tweet_ids(sent_tweet_ids)
-                except Exception as e:
-                    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    print(f"{current_time} 发生错误: {e}")
-
-            url_index = end_index  # 直接更新为 end_index
-            if url_index == len(target_urls):
-                url_index = 0  # 如果读取到末尾，则重置为 0
-
-        sleep_time = random.randint(5400, 10800)
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"{current_time} Sleeping for {sleep_time} seconds...")
-        await asyncio.sleep(sleep_time)
+    try:
+        while True:
+            # 页面被关闭或浏览器崩溃后，浏览器池会重建页面，此时重新登录
+            async with browser_pool.page() as page:
+                await login_if_needed(page)
+
+                start_index = url_index
+                end_index = min(url_index + 40, len(target_urls))
+                urls_to_process = list(target_urls.items())[start_index:end_index]
+
+                pending = []
+                for username, url in urls_to_process:
+                    try:
+                        new_tweets = await get_tweets(page, username, url)
+                        # 翻译和推送在后台进行，与后续用户的推文合并成批次推理
+                        for tweet_text, tweet_url, tweet_id in new_tweets:
+                            pending.append(asyncio.create_task(send_new_tweet(tweet_text, tweet_url, tweet_id, username)))
+                    except Exception as e:
+                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        print(f"{current_time} 发生错误: {e}")
+                await asyncio.gather(*pending)
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                if startup_time is not None:
+                    print(f"{current_time} 启动到首轮轮询完成用时 {time.time() - startup_time:.1f} 秒")
+                    startup_time = None
+                print(f"{current_time} {generator.report()}")
+                print(f"{current_time} {translation_cache.report()}")
+                print(f"{current_time} {browser_pool.report()}")
+
+                url_index = end_index  # 直接更新为 end_index
+                if url_index == len(target_urls):
+                    url_index = 0  # 如果读取到末尾，则重置为 0
+
+            sleep_time = random.randint(5400, 10800)
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{current_time} Sleeping for {sleep_time} seconds...")
+            await asyncio.sleep(sleep_time)
+    finally:
+        await browser_pool.close()
 
 
 if __name__ == "__main__":
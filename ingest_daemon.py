@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一的采集守护进程：在一个进程、一个事件循环中运行所有数据源，替代多个独立的常驻脚本
+
+- 每个数据源对应一个原有脚本（SourceAdapter），运行该脚本的 main() 循环，脚本本身仍可单独运行
+- 共用同一个去重库实例（dedup_store.open_store，按库文件共享）
+- 共用同一个Ollama客户端（ollama_client）；本地模型由本地推理服务（local_llm_server.py）统一加载
+- 共用同一个飞书发送器（feishu），同一个机器人的消息统一限速
+- 某个数据源异常退出时只重启该数据源，不影响其他数据源
+
+用法:
+    python ingest_daemon.py                          # 运行全部数据源
+    python ingest_daemon.py --sources 36kr bloomberg # 只运行指定数据源
+    python ingest_daemon.py --list                   # 列出可用的数据源
+"""
+
+import argparse
+import asyncio
+import importlib
+import threading
+from datetime import datetime
+
+import dedup_store
+import feishu
+import ollama_client
+import translation_cache
+
+RESTART_DELAY = 60  # 数据源异常退出后的重启等待时间（秒）
+REPORT_INTERVAL = 3600  # 汇总统计的打印间隔（秒）
+
+
+class SourceAdapter:
+    """
+    一个数据源，对应一个原有脚本
+    module_name: 脚本的模块名，启用时才导入，未启用的数据源不加载其依赖
+    blocking: 脚本的main()是同步函数时为True，在单独的守护线程中运行
+    """
+
+    def __init__(self, name, module_name, blocking=False):
+        self.name = name
+        self.module_name = module_name
+        self.blocking = blocking
+
+    def load(self):
+        return importlib.import_module(self.module_name)
+
+    async def run(self):
+        module = self.load()
+        if self.blocking:
+            await self._run_in_thread(module.main)
+        else:
+            await module.main()
+
+    async def _run_in_thread(self, func):
+        # 不使用默认线程池：同步脚本的长时间休眠会让进程退出时一直等待线程结束
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(callback, value):
+            if not future.done():
+                callback(value)
+
+        def target():
+            try:
+                result = func()
+            except BaseException as e:
+                loop.call_soon_threadsafe(resolve, future.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(resolve, future.set_result, result)
+
+        threading.Thread(target=target, name=f"source-{self.name}", daemon=True).start()
+        return await future
+
+
+SOURCES = {
+    "36kr": SourceAdapter("36kr", "fetch_36kr_RSS_updates_and_push"),
+    "finance": SourceAdapter("finance", "fetch_finance_updates_and_push"),
+    "zsxq": SourceAdapter("zsxq", "fetch_zsxq_RSS_updates_and_push"),
+    "bloomberg": SourceAdapter("bloomberg", "fetch_bloomberg_reuters_RSS_updates_and_push"),
+    "reddit": SourceAdapter("reddit", "fetch_reddit_RSS_updates_and_push"),
+    "arxiv": SourceAdapter("arxiv", "fetch_arxiv_updates", blocking=True),
+    "twitter_rss": SourceAdapter("twitter_rss", "fetch_twitter_RSS_updates_and_push"),
+    "twikit": SourceAdapter("twikit", "fetch_twikit_updates_and_push"),
+    "stocknews": SourceAdapter("stocknews", "stocknews_read_and_push"),
+}
+
+
+def log(message):
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} [守护进程] {message}")
+
+
+async def supervise(adapter):
+    """运行一个数据源，异常或退出后等待一段时间重启"""
+    while True:
+        try:
+            log(f"启动数据源 {adapter.name}")
+            await adapter.run()
+            log(f"数据源 {adapter.name} 的循环已退出，{RESTART_DELAY}秒后重启")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"数据源 {adapter.name} 发生异常: {e}，{RESTART_DELAY}秒后重启")
+        dedup_store.commit_all()
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def report_loop():
+    """定期提交去重库并打印共用组件的统计"""
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        dedup_store.commit_all()
+        log(ollama_client.get_client().report())
+        log(translation_cache.report())
+        log(feishu.get_sender().report())
+
+
+async def main(names):
+    tasks = [asyncio.create_task(supervise(SOURCES[name])) for name in names]
+    tasks.append(asyncio.create_task(report_loop()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        dedup_store.commit_all()
+        await feishu.get_sender().close()
+        await ollama_client.get_client().close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="在一个进程中运行所有采集数据源")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES), help="要运行的数据源，默认全部")
+    parser.add_argument("--list", action="store_true", help="列出可用的数据源后退出")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.list:
+        for name, adapter in SOURCES.items():
+            print(f"{name}: {adapter.module_name}.py")
+    else:
+        try:
+            asyncio.run(main(args.sources))
+        except KeyboardInterrupt:
+            print("程序被用户中断")
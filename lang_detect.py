@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于Unicode字符类别的快速语言判断，用来跳过“是否为非中文”的模型调用
+
+只处理明显的情况（几乎全是汉字 / 没有汉字），真正混合的文本返回None，交给模型判断。
+"""
+
+import re
+
+CHINESE = "chinese"
+NON_CHINESE = "non_chinese"
+
+# 链接、@用户名、#话题不参与判断
+IGNORED_PATTERN = re.compile(r"https?://\S+|[@#]\w+")
+
+# 汉字占字母类字符的比例达到该值视为中文（拉丁字母按字符计数，中英混排时字母数偏多）
+CHINESE_RATIO = 0.5
+# 汉字比例不超过该值视为非中文
+NON_CHINESE_RATIO = 0.05
+
+stats = {CHINESE: 0, NON_CHINESE: 0, "deferred": 0}
+
+
+def is_han(ch):
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF  # 基本区
+        or 0x3400 <= code <= 0x4DBF  # 扩展A
+        or 0x20000 <= code <= 0x2A6DF  # 扩展B
+        or 0xF900 <= code <= 0xFAFF  # 兼容汉字
+    )
+
+
+def is_kana_or_hangul(ch):
+    code = ord(ch)
+    return 0x3040 <= code <= 0x30FF or 0xAC00 <= code <= 0xD7AF or 0x1100 <= code <= 0x11FF
+
+
+def classify_language(text):
+    """返回 CHINESE、NON_CHINESE，无法确定时返回None"""
+    han = 0
+    other = 0
+    kana_or_hangul = 0
+    for ch in IGNORED_PATTERN.sub(" ", text):
+        if is_han(ch):
+            han += 1
+        elif ch.isalpha():
+            other += 1  # 拉丁字母、假名、谚文等
+            if is_kana_or_hangul(ch):
+                kana_or_hangul += 1
+    if han + other == 0:
+        result = CHINESE  # 只有链接、数字或表情，不需要翻译
+    else:
+        ratio = han / (han + other)
+        if ratio >= CHINESE_RATIO:
+            result = CHINESE
+        elif ratio <= NON_CHINESE_RATIO:
+            result = NON_CHINESE
+        else:
+            result = None
+        if result == CHINESE and kana_or_hangul:
+            result = None  # 日文、韩文中也有汉字，交给模型判断
+    stats[result or "deferred"] += 1
+    return result
+
+
+def report():
+    """返回统计信息字符串，供各脚本在每轮结束时打印"""
+    avoided = stats[CHINESE] + stats[NON_CHINESE]
+    return f"语言检测: 本地判断 {avoided} 次（中文 {stats[CHINESE]}，非中文 {stats[NON_CHINESE]}），节省模型调用 {avoided} 次，交给模型 {stats['deferred']} 次"
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地transformers模型的批量推理
+
+- BatchedGenerator: 多个协程各自提交一条对话，队列在 max_wait 秒内凑够最多 max_batch_size 条后，
+  左侧补齐成一个批次，调用一次 model.generate，再把结果分发给各自的调用方
+- LazyGenerator: 在第一次请求时才加载模型（load_model）并创建BatchedGenerator，空闲一段时间后自动卸载
+- 本地推理服务（local_llm_server.py）是唯一加载模型的进程，内部使用LazyGenerator
+- LocalLLMClient: 各转发脚本通过它调用本地推理服务，不再各自加载一份模型
+"""
+
+import asyncio
+import gc
+import os
+import time
+
+import aiohttp
+
+# 本地推理服务地址，也可以是Unix socket，例如 unix:///tmp/local_llm.sock
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "http://127.0.0.1:8765")
+
+
+class BatchedGenerator:
+    """
+    用法:
+        generator = BatchedGenerator(model, tokenizer, max_batch_size=8, max_wait=0.5)
+        text = await generator.generate(messages, max_new_tokens=512)
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait=0.5):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None
+        self.worker = None
+        self.stats = {"requests": 0, "batches": 0, "generate_seconds": 0.0}
+        # 批量生成需要左侧补齐，保证所有序列的新token都从同一位置开始
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+    async def generate(self, messages, max_new_tokens=512):
+        """提交一条对话，返回模型生成的文本"""
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((messages, max_new_tokens, future))
+        return await future
+
+    async def _collect_batch(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # max_new_tokens不同的请求分开生成，避免短回答被长上限拖慢
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[1], []).append(request)
+            for max_new_tokens, requests in groups.items():
+                futures = [future for _, _, future in requests]
+                try:
+                    outputs = await asyncio.to_thread(self._generate_batch, [messages for messages, _, _ in requests], max_new_tokens)
+                except Exception as e:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future, output in zip(futures, outputs):
+                    if not future.done():
+                        future.set_result(output)
+
+    def _generate_batch(self, messages_list, max_new_tokens):
+        start = time.time()
+        texts = [self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True) for messages in messages_list]
+        model_inputs = self.tokenizer(texts, return_tensors="pt", padding=True).to(self.model.device)
+        generated_ids = self.model.generate(**model_inputs, max_new_tokens=max_new_tokens)
+        # 左侧补齐后所有输入长度相同，直接截掉输入部分即为新生成的token
+        generated_ids = generated_ids[:, model_inputs.input_ids.shape[1]:]
+        outputs = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+        self.stats["requests"] += len(messages_list)
+        self.stats["batches"] += 1
+        self.stats["generate_seconds"] += time.time() - start
+        return outputs
+
+    def report(self):
+        """返回统计信息字符串，供各脚本在每轮结束时打印"""
+        requests = self.stats["requests"]
+        batches = self.stats["batches"]
+        average = requests / batches if batches else 0
+        return f"批量推理: {requests} 条请求, {batches} 次generate, 平均批大小 {average:.1f}, 生成耗时 {self.stats['generate_seconds']:.1f} 秒"
+
+
+def load_model(model_name, cache_dir=None, device="auto"):
+    """
+    加载模型及分词器，返回 (model, tokenizer)
+    device="cpu" 时以float32加载到CPU，用于没有GPU的环境
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype="float32" if device == "cpu" else "auto",
+        device_map="cpu" if device == "cpu" else "auto",
+        cache_dir=cache_dir
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    return model, tokenizer
+
+
+class LazyGenerator:
+    """
+    按需加载的批量推理队列，generate/report接口与BatchedGenerator相同
+    - 第一次generate时才加载模型，启动和没有新条目的轮次不需要等待模型加载
+    - 连续 idle_timeout 秒没有请求时卸载模型、释放显存，下次请求时重新加载；None表示不卸载
+    """
+
+    def __init__(self, model_name, cache_dir=None, max_batch_size=8, max_wait=0.5, device="auto", idle_timeout=1800):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.device = device
+        self.idle_timeout = idle_timeout
+        self.generator = None
+        self.load_lock = None
+        self.watcher = None
+        self.active = 0
+        self.last_used = time.time()
+        self.stats = {"loads": 0, "unloads": 0, "load_seconds": 0.0}
+
+    @property
+    def loaded(self):
+        return self.generator is not None
+
+    async def load(self):
+        """加载模型（已加载时直接返回），返回批量推理队列"""
+        if self.load_lock is None:
+            self.load_lock = asyncio.Lock()
+        async with self.load_lock:
+            if self.generator is None:
+                start = time.time()
+                print(f"正在加载模型 {self.model_name}（{self.device}）...")
+                model, tokenizer = await asyncio.to_thread(load_model, self.model_name, self.cache_dir, self.device)
+                self.generator = BatchedGenerator(model, tokenizer, max_batch_size=self.max_batch_size, max_wait=self.max_wait)
+                self.stats["loads"] += 1
+                self.stats["load_seconds"] += time.time() - start
+                print(f"模型加载完成，用时 {time.time() - start:.1f} 秒")
+            if self.idle_timeout is not None and (self.watcher is None or self.watcher.done()):
+                self.watcher = asyncio.create_task(self._unload_when_idle())
+        return self.generator
+
+    async def generate(self, messages, max_new_tokens=512):
+        """提交一条对话，返回模型生成的文本"""
+        self.active += 1
+        try:
+            generator = await self.load()
+            return await generator.generate(messages, max_new_tokens=max_new_tokens)
+        finally:
+            self.active -= 1
+            self.last_used = time.time()
+
+    async def _unload_when_idle(self):
+        while self.generator is not None:
+            await asyncio.sleep(max(1, self.last_used + self.idle_timeout - time.time()))
+            if self.active == 0 and time.time() - self.last_used >= self.idle_timeout:
+                await self.unload()
+
+    async def unload(self):
+        """卸载模型并释放显存"""
+        if self.load_lock is None:
+            self.load_lock = asyncio.Lock()
+        async with self.load_lock:
+            if self.generator is None:
+                return
+            if self.generator.worker is not None:
+                self.generator.worker.cancel()
+            self.generator = None
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+            self.stats["unloads"] += 1
+            print(f"模型 {self.model_name} 空闲超过 {self.idle_timeout} 秒，已卸载")
+
+    def report(self):
+        """返回统计信息字符串"""
+        state = "已加载" if self.loaded else "未加载"
+        report = f"模型{state}, 加载 {self.stats['loads']} 次（共 {self.stats['load_seconds']:.1f} 秒）, 卸载 {self.stats['unloads']} 次"
+        if self.generator is not None:
+            report += ", " + self.generator.report()
+        return report
+
+
+class LocalLLMClient:
+    """
+    本地推理服务的客户端，generate/report接口与BatchedGenerator相同，可直接替换
+    用法:
+        generator = LocalLLMClient("http://127.0.0.1:8765")
+        text = await generator.generate(messages, max_new_tokens=512)
+    """
+
+    def __init__(self, url=LOCAL_LLM_URL, timeout=600):
+        self.url = url
+        self.timeout = timeout
+        self.session = None
+        self.loop = None
+        self.stats = {"requests": 0, "errors": 0, "seconds": 0.0}
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.loop is not loop:
+            if self.url.startswith("unix://"):
+                connector = aiohttp.UnixConnector(path=self.url[len("unix://"):])
+            else:
+                connector = aiohttp.TCPConnector()
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.loop = loop
+        return self.session
+
+    def _endpoint(self, path):
+        base_url = "http://localhost" if self.url.startswith("unix://") else self.url.rstrip("/")
+        return base_url + path
+
+    async def generate(self, messages, max_new_tokens=512):
+        """提交一条对话，返回模型生成的文本"""
+        session = await self._get_session()
+        start = time.time()
+        try:
+            async with session.post(self._endpoint("/generate"), json={"messages": messages, "max_new_tokens": max_new_tokens}) as response:
+                result = await response.json(content_type=None)
+                if response.status != 200:
+                    raise RuntimeError(f"本地推理服务调用失败: {response.status}, {result.get('error')}")
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["requests"] += 1
+        self.stats["seconds"] += time.time() - start
+        return result["text"]
+
+    def report(self):
+        """返回统计信息字符串，供各脚本在每轮结束时打印"""
+        requests = self.stats["requests"]
+        average = self.stats["seconds"] / requests if requests else 0
+        return f"本地推理服务({self.url}): {requests} 条请求, 失败 {self.stats['errors']} 次, 平均耗时 {average:.2f} 秒"
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
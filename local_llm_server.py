@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地推理服务：只加载一次Qwen模型，供各转发脚本通过 local_llm.LocalLLMClient 调用
+
+- 所有脚本的请求进入同一个批量推理队列（local_llm.BatchedGenerator），合并成批次生成
+- 模型在第一次请求时才加载（--preload 可在启动时加载），空闲超过 --idle-unload 秒后卸载、释放显存
+- 支持HTTP端口或Unix socket
+- 没有GPU时自动改用CPU加载（AWQ量化模型只能在GPU上运行，CPU下改用 --cpu-model 指定的小模型），
+  便于在没有GPU的机器上联调；此时译文质量与正式模型不同，建议同时设置独立的 TRANSLATION_CACHE_DB
+
+接口:
+    POST /generate  {"messages": [...], "max_new_tokens": 512}  ->  {"text": "...", "model": "..."}
+    GET  /health                                               ->  {"status": "ok", "model": "...", "device": "...", "loaded": true}
+    GET  /stats                                                ->  批量推理统计
+
+用法:
+    python local_llm_server.py                                  # 监听 127.0.0.1:8765
+    python local_llm_server.py --unix-socket /tmp/local_llm.sock
+    python local_llm_server.py --device cpu                     # 强制使用CPU
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+from local_llm import LazyGenerator
+
+DEFAULT_MODEL = "Qwen/Qwen2.5-7B-Instruct-AWQ"
+DEFAULT_CPU_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"
+DEFAULT_CACHE_DIR = "/home/kemove/.cache/huggingface/hub"
+
+
+def detect_device(requested):
+    if requested != "auto":
+        return requested
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+async def handle_generate(request):
+    try:
+        data = await request.json()
+        messages = data["messages"]
+        max_new_tokens = int(data.get("max_new_tokens", 512))
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("messages必须是非空列表")
+    except (ValueError, KeyError, TypeError) as e:
+        return web.json_response({"error": f"请求格式错误: {e}"}, status=400)
+    try:
+        text = await request.app["generator"].generate(messages, max_new_tokens=max_new_tokens)
+    except Exception as e:
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 生成失败: {e}")
+        return web.json_response({"error": str(e)}, status=500)
+    return web.json_response({"text": text, "model": request.app["model_name"]})
+
+
+async def handle_health(request):
+    return web.json_response({
+        "status": "ok",
+        "model": request.app["model_name"],
+        "device": request.app["device"],
+        "loaded": request.app["generator"].loaded,
+    })
+
+
+async def handle_stats(request):
+    generator = request.app["generator"]
+    return web.json_response({**generator.stats, "report": generator.report()})
+
+
+async def preload_model(app):
+    start = time.time()
+    await app["generator"].load()
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 启动到模型就绪用时 {time.time() - start:.1f} 秒")
+
+
+async def unload_model(app):
+    await app["generator"].unload()
+
+
+def create_app(model_name, cache_dir, device, max_batch_size, max_wait, idle_timeout=1800, preload=False):
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["model_name"] = model_name
+    app["device"] = device
+    app["generator"] = LazyGenerator(model_name, cache_dir=cache_dir, max_batch_size=max_batch_size, max_wait=max_wait,
+                                     device=device, idle_timeout=idle_timeout)
+    if preload:
+        app.on_startup.append(preload_model)
+    app.on_cleanup.append(unload_model)
+    app.router.add_post("/generate", handle_generate)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/stats", handle_stats)
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="本地Qwen推理服务")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="GPU上加载的模型")
+    parser.add_argument("--cpu-model", default=DEFAULT_CPU_MODEL, help="没有GPU时改用的模型")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="huggingface模型缓存目录")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], default="auto", help="auto: 有GPU用GPU，否则用CPU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="监听Unix socket而不是TCP端口")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="单次generate最多合并的请求数")
+    parser.add_argument("--max-wait", type=float, default=0.5, help="凑批的最长等待时间（秒）")
+    parser.add_argument("--idle-unload", type=float, default=1800, help="空闲多少秒后卸载模型，0表示不卸载")
+    parser.add_argument("--preload", action="store_true", help="启动时立即加载模型，而不是等到第一次请求")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    device = detect_device(args.device)
+    model_name = args.model
+    if device == "cpu" and "AWQ" in model_name.upper():
+        print(f"当前使用CPU，AWQ量化模型 {model_name} 无法加载，改用 {args.cpu_model}")
+        model_name = args.cpu_model
+    app = create_app(model_name, args.cache_dir, device, args.max_batch_size, args.max_wait,
+                     idle_timeout=args.idle_unload or None, preload=args.preload)
+    if args.unix_socket:
+        web.run_app(app, path=args.unix_socket)
+    else:
+        web.run_app(app, host=args.host, port=args.port)
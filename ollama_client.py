@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各脚本共用的Ollama客户端
+
+- 复用一个keep-alive连接池，不再每次调用都新建ClientSession
+- 按模型限制并发数，与服务端的 OLLAMA_NUM_PARALLEL 保持一致，多余的请求在本地排队
+- 请求超时；5xx和网络错误按指数退避加随机抖动重试
+- 统计每个模型的调用次数、耗时和token数
+- classify 以流式方式读取回复，出现完整的第一个词（yes/no）即返回并断开连接，服务端随之停止生成
+
+异步脚本:
+    from ollama_client import chat
+    text = await chat(messages, model="qwen2.5:14b")
+
+是/否判断:
+    from ollama_client import classify
+    answer = await classify(messages)  # "yes"、"no" 或模型给出的其他首词
+
+同步脚本:
+    from ollama_client import chat_sync
+    text = chat_sync(messages, model="qwen2.5:14b")
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/chat")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:14b")
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# 是/否判断只需要第一个词，限制生成长度并关闭采样随机性
+CLASSIFY_OPTIONS = {"num_predict": 4, "temperature": 0}
+
+
+class OllamaError(Exception):
+    pass
+
+
+class RetryableOllamaError(OllamaError):
+    pass
+
+
+class OllamaClient:
+    def __init__(self, api_url=OLLAMA_API_URL, default_model=OLLAMA_MODEL, num_parallel=OLLAMA_NUM_PARALLEL,
+                 timeout=300, max_retries=3, retry_backoff=1.0):
+        self.api_url = api_url
+        self.default_model = default_model
+        self.num_parallel = num_parallel
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session = None
+        self.loop = None
+        self.semaphores = {}
+        self.sync_session = requests.Session()
+        self.sync_semaphores = {}
+        self.sync_lock = threading.Lock()
+        # chat_sync可能在其他线程中调用（如ingest_daemon中的同步数据源），统计的更新与读取都要加锁
+        self.metrics_lock = threading.Lock()
+        self.metrics = {}
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.loop is not loop:
+            # 每个事件循环一个连接池，连接数与并发上限匹配
+            connector = aiohttp.TCPConnector(limit=self.num_parallel * 2, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.loop = loop
+            self.semaphores = {}
+        return self.session
+
+    def _semaphore(self, model):
+        if model not in self.semaphores:
+            self.semaphores[model] = asyncio.Semaphore(self.num_parallel)
+        return self.semaphores[model]
+
+    def _sync_semaphore(self, model):
+        with self.sync_lock:
+            if model not in self.sync_semaphores:
+                self.sync_semaphores[model] = threading.Semaphore(self.num_parallel)
+            return self.sync_semaphores[model]
+
+    def _payload(self, messages, model, response_format, options, stream=False):
+        payload = {
+            "model": model or self.default_model,
+            "messages": messages,
+            "stream": stream
+        }
+        if response_format is not None:
+            payload["format"] = response_format
+        if options:
+            payload["options"] = options
+        return payload
+
+    def _retry_delay(self, attempt):
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _metric(self, model):
+        # 调用方需持有self.metrics_lock
+        return self.metrics.setdefault(model, {
+            "calls": 0, "errors": 0, "retries": 0, "early_stops": 0, "seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0
+        })
+
+    def _record(self, model, latency, result=None, error=False):
+        with self.metrics_lock:
+            metric = self._metric(model)
+            if error:
+                metric["errors"] += 1
+                return
+            metric["calls"] += 1
+            metric["seconds"] += latency
+            if result:
+                metric["prompt_tokens"] += result.get("prompt_eval_count", 0)
+                metric["output_tokens"] += result.get("eval_count", 0)
+
+    def _count_early_stop(self, model):
+        with self.metrics_lock:
+            self._metric(model)["early_stops"] += 1
+
+    def _count_retry(self, model):
+        with self.metrics_lock:
+            self._metric(model)["retries"] += 1
+
+    async def chat(self, messages, model=None, response_format=None, options=None):
+        """调用 /api/chat，返回回复文本；response_format="json" 时要求模型输出JSON"""
+        payload = self._payload(messages, model, response_format, options)
+        model = payload["model"]
+        session = await self._get_session()
+        async with self._semaphore(model):
+            for attempt in range(self.max_retries + 1):
+                start = time.time()
+                try:
+                    async with session.post(self.api_url, json=payload) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            self._record(model, time.time() - start, result)
+                            return result["message"]["content"]
+                        error_text = await response.text()
+                        if response.status < 500:
+                            self._record(model, 0, error=True)
+                            raise OllamaError(f"Ollama API调用失败: {response.status}, {error_text}")
+                        raise RetryableOllamaError(f"Ollama API调用失败: {response.status}, {error_text}")
+                except (RetryableOllamaError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        self._record(model, 0, error=True)
+                        raise OllamaError(f"Ollama API调用失败（已重试{self.max_retries}次）: {e}") from e
+                    self._count_retry(model)
+                    await asyncio.sleep(self._retry_delay(attempt))
+
+    async def classify(self, messages, model=None, options=None):
+        """
+        流式调用 /api/chat，返回回复的第一个词（小写、只保留字母数字）
+        第一个词完整出现（后面跟了非字母字符或生成结束）后立即断开连接，不等待模型生成其余内容
+        """
+        payload = self._payload(messages, model, None, {**CLASSIFY_OPTIONS, **(options or {})}, stream=True)
+        model = payload["model"]
+        session = await self._get_session()
+        async with self._semaphore(model):
+            for attempt in range(self.max_retries + 1):
+                start = time.time()
+                try:
+                    async with session.post(self.api_url, json=payload) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            if response.status < 500:
+                                self._record(model, 0, error=True)
+                                raise OllamaError(f"Ollama API调用失败: {response.status}, {error_text}")
+                            raise RetryableOllamaError(f"Ollama API调用失败: {response.status}, {error_text}")
+                        text = ""
+                        async for line in response.content:
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            text += chunk.get("message", {}).get("content", "")
+                            if chunk.get("done"):
+                                self._record(model, time.time() - start, chunk)
+                                return first_word(text)
+                            if first_word_complete(text):
+                                # 第一个词已经结束，断开连接让服务端停止生成
+                                response.close()
+                                self._record(model, time.time() - start)
+                                self._count_early_stop(model)
+                                return first_word(text)
+                        self._record(model, time.time() - start)
+                        return first_word(text)
+                except (RetryableOllamaError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        self._record(model, 0, error=True)
+                        raise OllamaError(f"Ollama API调用失败（已重试{self.max_retries}次）: {e}") from e
+                    self._count_retry(model)
+                    await asyncio.sleep(self._retry_delay(attempt))
+
+    def chat_sync(self, messages, model=None, response_format=None, options=None):
+        """chat的同步版本，供不使用asyncio的脚本调用"""
+        payload = self._payload(messages, model, response_format, options)
+        model = payload["model"]
+        with self._sync_semaphore(model):
+            for attempt in range(self.max_retries + 1):
+                start = time.time()
+                try:
+                    response = self.sync_session.post(self.api_url, json=payload, timeout=self.timeout)
+                    if response.status_code == 200:
+                        result = response.json()
+                        self._record(model, time.time() - start, result)
+                        return result["message"]["content"]
+                    if response.status_code < 500:
+                        self._record(model, 0, error=True)
+                        raise OllamaError(f"Ollama API调用失败: {response.status_code}, {response.text}")
+                    raise RetryableOllamaError(f"Ollama API调用失败: {response.status_code}, {response.text}")
+                except (RetryableOllamaError, requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == self.max_retries:
+                        self._record(model, 0, error=True)
+                        raise OllamaError(f"Ollama API调用失败（已重试{self.max_retries}次）: {e}") from e
+                    self._count_retry(model)
+                    time.sleep(self._retry_delay(attempt))
+
+    def report(self):
+        """返回各模型的调用统计字符串"""
+        with self.metrics_lock:
+            metrics = {model: dict(metric) for model, metric in self.metrics.items()}
+        lines = []
+        for model, metric in metrics.items():
+            average = metric["seconds"] / metric["calls"] if metric["calls"] else 0
+            lines.append(
+                f"Ollama[{model}]: 调用 {metric['calls']} 次, 提前结束 {metric['early_stops']} 次, "
+                f"失败 {metric['errors']} 次, 重试 {metric['retries']} 次, "
+                f"平均耗时 {average:.2f} 秒, 输入token {metric['prompt_tokens']}, 输出token {metric['output_tokens']}"
+            )
+        return "\n".join(lines) if lines else "Ollama: 暂无调用"
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+def first_word(text):
+    """取回复的第一个词，去掉标点并转为小写"""
+    words = text.split()
+    if not words:
+        return ""
+    return "".join(ch for ch in words[0] if ch.isalnum()).lower()
+
+
+def first_word_complete(text):
+    """第一个词之后是否已经出现非字母数字字符（开头的引号、空白等不算）"""
+    started = False
+    for ch in text:
+        if ch.isalnum():
+            started = True
+        elif started:
+            return True
+    return False
+
+
+default_client = None
+default_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共用的默认客户端，可在多个线程中调用"""
+    global default_client
+    with default_client_lock:
+        if default_client is None:
+            default_client = OllamaClient()
+        return default_client
+
+
+async def chat(messages, model=None, response_format=None, options=None):
+    return await get_client().chat(messages, model=model, response_format=response_format, options=options)
+
+
+async def classify(messages, model=None, options=None):
+    return await get_client().classify(messages, model=model, options=options)
+
+
+def chat_sync(messages, model=None, response_format=None, options=None):
+    return get_client().chat_sync(messages, model=model, response_format=response_format, options=options)
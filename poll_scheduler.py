@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按源自适应的轮询调度，替代各脚本中固定的休眠时长
+
+- 每个源记录新条目的到达间隔（按发布时间计算的指数滑动平均）
+- 有新条目时，下次轮询间隔取平均到达间隔的 POLL_FRACTION 倍，更新频繁的源（如10jqka实时快讯）轮询得更勤
+- 没有新条目时间隔逐步放大，很少更新的源（如caixin/database）轮询得更少
+- 请求失败时按 ERROR_BACKOFF 倍退避
+- 间隔始终限制在 [min_interval, max_interval] 内，并加入少量随机抖动，状态保存在json文件中
+
+用法:
+    scheduler = PollScheduler("xxx_push/poll_state.json", min_interval=120, max_interval=6 * 3600)
+    for url in scheduler.due(urls):
+        ...抓取，收集新条目的发布时间...
+        scheduler.record(url, new_item_times)   # 或失败时 scheduler.record_error(url)
+    scheduler.save()
+    await asyncio.sleep(scheduler.sleep_time(urls))
+"""
+
+import calendar
+import json
+import os
+import random
+import time
+
+ALPHA = 0.3  # 到达间隔滑动平均的权重
+POLL_FRACTION = 0.5  # 轮询间隔 = 平均到达间隔 * POLL_FRACTION
+QUIET_BACKOFF = 1.5  # 没有新条目时间隔放大的倍数
+ERROR_BACKOFF = 2.0  # 请求失败时间隔放大的倍数
+JITTER = 0.1  # 随机抖动比例，避免所有源同时到期
+
+
+def entry_timestamp(entry):
+    """feedparser条目的发布时间（秒），没有时返回当前时间"""
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(parsed) if parsed else time.time()
+
+
+class PollScheduler:
+    """
+    state_file: 状态保存路径
+    min_interval / max_interval: 轮询间隔的上下限（秒）
+    default_interval: 新源的初始间隔，默认为 max_interval 与 min_interval 的几何平均
+    """
+
+    def __init__(self, state_file, min_interval, max_interval, default_interval=None):
+        self.state_file = state_file
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval or (min_interval * max_interval) ** 0.5
+        self.state = {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except ValueError:
+                print(f"调度状态文件 {state_file} 损坏，重新开始记录")
+
+    def _feed(self, feed):
+        return self.state.setdefault(feed, {
+            "interval": self.default_interval,
+            "next_poll": 0,
+            "mean_gap": None,
+            "last_item_time": None,
+        })
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _schedule(self, feed_state, interval):
+        feed_state["interval"] = self._clamp(interval)
+        feed_state["next_poll"] = time.time() + feed_state["interval"] * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def due(self, feeds):
+        """返回已到轮询时间的源（新源立即到期），保持传入顺序"""
+        now = time.time()
+        return [feed for feed in feeds if self._feed(feed)["next_poll"] <= now]
+
+    def record(self, feed, new_item_times):
+        """记录一次成功的轮询，new_item_times为本次新条目的发布时间（秒）"""
+        feed_state = self._feed(feed)
+        if not new_item_times:
+            self._schedule(feed_state, feed_state["interval"] * QUIET_BACKOFF)
+            return
+        previous = feed_state["last_item_time"]
+        for item_time in sorted(new_item_times):
+            if previous is not None and item_time > previous:
+                gap = item_time - previous
+                mean_gap = feed_state["mean_gap"]
+                feed_state["mean_gap"] = gap if mean_gap is None else ALPHA * gap + (1 - ALPHA) * mean_gap
+            previous = item_time if previous is None else max(previous, item_time)
+        feed_state["last_item_time"] = previous
+        if feed_state["mean_gap"] is None:
+            self._schedule(feed_state, feed_state["interval"])
+        else:
+            self._schedule(feed_state, feed_state["mean_gap"] * POLL_FRACTION)
+
+    def record_error(self, feed):
+        feed_state = self._feed(feed)
+        self._schedule(feed_state, feed_state["interval"] * ERROR_BACKOFF)
+
+    def sleep_time(self, feeds):
+        """距离下一个源到期的秒数"""
+        now = time.time()
+        next_poll = min((self._feed(feed)["next_poll"] for feed in feeds), default=now + self.max_interval)
+        return max(1, next_poll - now)
+
+    def save(self):
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def report(self, feeds):
+        """返回各源当前轮询间隔的字符串"""
+        parts = []
+        for feed in feeds:
+            feed_state = self._feed(feed)
+            parts.append(f"{feed} 每{feed_state['interval'] / 60:.0f}分钟")
+        return "轮询间隔: " + ", ".join(parts)
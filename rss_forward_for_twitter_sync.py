@@ -1,11 +1,15 @@
 import asyncio
-import json
 import time
 from datetime import datetime
 import aiohttp
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from selenium import webdriver
 import feedparser
+from dedup_store import open_store
+import feishu
+from local_llm import LocalLLMClient
+import translation_cache
+from translation_cache import cached_translate
+
+startup_time = time.time()  # 用于统计启动到首轮轮询完成的耗时
 
 # --- 配置 ---
 webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/f97028b8-d693-4c23-989b-639a68807e2d"
@@ -21,45 +25,37 @@ target_usernames = ["myfxtrader", "tzwqbest", "GlobalMoneyAI", "AsiaFinance", "O
                     "markets", "stocktalkweekly", "MonkEchevarria", "ThetaWarrior", "MacroMargin", "hybooonews",
                     "TradingThomas3", "WSJ", "TheTranscript_", "Tesla_Cybercat", "BilingualReader", "The_RockTrading",
                     "realDonaldTrump", "elonmusk", "SpaceX"]
-target_urls = {username: f"https:/localhost:1200/rsshub.app/twitter/user/{username}" for username in target_usernames}
+target_urls = {username: f"http://localhost:1200/twitter/user/{username}" for username in target_usernames}
 sent_tweets_file = "twitter_push/sent_tweets.json"
+sent_tweets_db = "twitter_push/sent_tweets.db"
 model_name = "Qwen/Qwen2.5-7B-Instruct-AWQ"
-cache_dir = '/home/kemove/.cache/huggingface/hub'
+llm_server_url = "http://127.0.0.1:8765"  # 本地推理服务地址（local_llm_server.py），也可以是 unix:///tmp/local_llm.sock
+# RSSHub直接返回XML，默认用HTTP抓取；只有放在这里的用户才改用无头浏览器（例如路由前面有需要执行JS的验证页）
+browser_usernames = set()
+max_connections_per_host = 8
+request_timeout = 30  # 秒
 # --- 配置结束 ---
 
 # 全局变量
 sent_tweet_ids = set()
 
-# 加载qwen模型及分词器
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype="auto",
-    device_map="auto",
-    cache_dir=cache_dir
-)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+# 模型由本地推理服务统一加载，这里只创建客户端
+generator = LocalLLMClient(llm_server_url)
 
 def load_sent_tweet_ids():
-    try:
-        with open(sent_tweets_file, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    return open_store(sent_tweets_db, legacy_file=sent_tweets_file)
 
 def save_sent_tweet_ids(ids):
-    with open(sent_tweets_file, "w") as f:
-        json.dump(list(ids), f)
+    ids.commit()
 
 async def send_to_feishu(tweet_text, tweet_url, username):
+    translate_prompt = "Translate this tweet into Chinese, return only the translated text: "
     messages = [
         {"role": "system", "content": "You are Qwen, a great reader and translator!"},
-        {"role": "user", "content": "Translate this tweet into Chinese, return only the translated text: " + tweet_text}
+        {"role": "user", "content": translate_prompt + tweet_text}
     ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
-    generated_ids = model.generate(**model_inputs, max_new_tokens=512)
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)]
-    response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    # 相同原文（例如多个账号转推同一条推文）直接使用缓存的译文
+    response = await cached_translate(tweet_text, model_name, translate_prompt, lambda: generator.generate(messages, max_new_tokens=512))
     translated_text = response.strip()
 
     message = {
@@ -78,13 +74,20 @@ async def send_to_feishu(tweet_text, tweet_url, username):
             }
         }
     }
-    headers = {'Content-Type': 'application/json'}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(webhook_url, json=message, headers=headers) as response:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {response.status}, 响应内容: {await response.text()}")
+    status, text = await feishu.send(webhook_url, message)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{current_time} 已推送推文到飞书，推文内容: {tweet_text}, 推文链接: {tweet_url}, 飞书响应状态码: {status}, 响应内容: {text}")
+
+async def fetch_rss_feed(session, url):
+    async with session.get(url) as response:
+        response.raise_for_status()
+        body = await response.read()
+    return feedparser.parse(body).entries
+
+def fetch_rss_feed_with_browser(url):
+    # 只在需要时导入，纯HTTP抓取的部署不依赖selenium
+    from selenium import webdriver
 
-def fetch_rss_feed(url):
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')  # 无头模式
 
@@ -98,23 +101,33 @@ def fetch_rss_feed(url):
     feed = feedparser.parse(page_source)
     return feed.entries
 
-async def process_twitter_rss_for_user(username, url):
+async def send_new_tweet(tweet_text, tweet_url, tweet_id, username):
+    await send_to_feishu(tweet_text, tweet_url, username)
+    sent_tweet_ids.add(tweet_id)
+
+async def process_twitter_rss_for_user(session, username, url):
     global sent_tweet_ids
     
     try:
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 正在抓取 {username} 的RSS更新...")
         
-        # 获取该用户的RSS更新
-        entries = fetch_rss_feed(url)
+        # 获取该用户的RSS更新，浏览器在单独的线程中运行，不阻塞其他用户的HTTP抓取
+        if username in browser_usernames:
+            entries = await asyncio.to_thread(fetch_rss_feed_with_browser, url)
+        else:
+            entries = await fetch_rss_feed(session, url)
         
+        tasks = []
         for entry in entries:
             tweet_text = entry.title
             tweet_url = entry.link
             tweet_id = username + tweet_url.split("/")[-1]  # 使用用户名+推文ID作为唯一标识符
 
             if tweet_id not in sent_tweet_ids:
-                await send_to_feishu(tweet_text, tweet_url, username)
-                sent_tweet_ids.add(tweet_id)
+                tasks.append(send_new_tweet(tweet_text, tweet_url, tweet_id, username))
+
+        # 新推文同时提交，与其他用户的推文合并成批次推理
+        await asyncio.gather(*tasks)
                 
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 完成 {username} 的RSS处理...")
 
@@ -122,19 +135,31 @@ async def process_twitter_rss_for_user(username, url):
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 处理 {username} 时发生错误: {e}，跳过该用户。")
 
 async def process_twitter_rss():
-    tasks = []
-    for username, url in target_urls.items():
-        tasks.append(process_twitter_rss_for_user(username, url))
-
-    # 并发执行多个任务
-    await asyncio.gather(*tasks)
+    start = time.time()
+    # 同一轮的请求共用连接池，gzip压缩传输
+    connector = aiohttp.TCPConnector(limit_per_host=max_connections_per_host)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=request_timeout),
+                                     headers={"Accept-Encoding": "gzip, deflate"}) as session:
+        tasks = []
+        for username, url in target_urls.items():
+            tasks.append(process_twitter_rss_for_user(session, username, url))
+
+        # 并发执行多个任务
+        await asyncio.gather(*tasks)
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 本轮处理 {len(target_urls)} 个RSS用时 {time.time() - start:.1f} 秒")
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {generator.report()}")
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {translation_cache.report()}")
 
 async def main():
-    global sent_tweet_ids
+    global sent_tweet_ids, startup_time
     sent_tweet_ids = load_sent_tweet_ids()
 
     while True:
         await process_twitter_rss()
+        if startup_time is not None:
+            # 模型由推理服务按需加载，没有新条目的轮次不需要等待模型
+            print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 启动到首轮轮询完成用时 {time.time() - startup_time:.1f} 秒")
+            startup_time = None
         save_sent_tweet_ids(sent_tweet_ids)
 
         # 每小时运行一次
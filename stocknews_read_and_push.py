@@ -1,16 +1,22 @@
 import asyncio
-import requests
+import json
 from crawl4ai import AsyncWebCrawler, CacheMode
-import aiohttp
 from bs4 import BeautifulSoup
 import os
 import random
 import time
 import yfinance as yf
+from ticker_cache import TickerInfoCache
+from dedup_store import open_store
+import feishu
+import ollama_client
+import translation_cache
+from translation_cache import cached_translate
+from stocktitan_parser import extract_news_items
 
-# Ollama API配置
-OLLAMA_API_URL = "http://localhost:11434/api/chat"  # Ollama API地址
+# Ollama API配置（地址和并发数见 ollama_client.py，可用环境变量 OLLAMA_API_URL / OLLAMA_NUM_PARALLEL 覆盖）
 OLLAMA_MODEL = "qwen2.5:14b"  # Ollama中的模型名称
+USE_STRUCTURED_OUTPUT = True  # 一次调用完成判断+标题翻译+详情摘要，解析失败时回退到多次调用
 
 check_conditions = [
     "1. There is a definite transaction amount.",
@@ -38,301 +44,428 @@ check_conditions = [
 check_message = ", ".join(check_conditions)
 
 workdir = "./stock_push"
-history_file = f"{workdir}/history_news.txt"
+history_file = f"{workdir}/history_news.txt"  # 旧格式，仅用于首次迁移
+history_db = f"{workdir}/history_news.db"
 markdowntext_file = f"{workdir}/news.md"
 
 os.makedirs(workdir, exist_ok=True)  # 创建工作目录
 
-def send_message_to_lark(message):
+# 新闻处理流水线各阶段的并发上限（推送阶段始终按旧→新顺序逐条执行）
+PIPELINE_WORKERS = {
+    "detail": 4,    # 详情页抓取
+    "classify": 2,  # 条件判断（Ollama）
+    "enrich": 2,    # 翻译及股票数据补全
+}
+pipeline_semaphores = {}
+
+# 股票信息缓存：公司资料及其中文简介长期有效，行情字段短期有效
+ticker_cache = TickerInfoCache(f"{workdir}/ticker_cache.db", profile_ttl=30 * 24 * 3600, quote_ttl=300)
+ticker_locks = {}  # 同一股票的并发请求只查询和翻译一次
+
+# 需要监测的列表页：(地址, 页面类型)，合并后同一条新闻只处理一次
+news_listing_pages = [
+    ("https://www.stocktitan.net/news/live.html", "feed"),
+    ("https://www.stocktitan.net/news/today", "feed"),
+    ("https://www.stocktitan.net/news/trending.html", "trending"),
+]
+LISTING_TIME_FORMATS = ["%m/%d/%Y %I:%M %p", "%m/%d/%Y"]  # 列表页的时间格式，用于合并多个页面时按时间排序
+
+# 列表页高水位：live/today页按新→旧排列，记录每个页面上次已处理的最新几条news_key，
+# 下次解析到其中任意一条即停止；记录多条是为了最新一条被删除时仍能找到停止位置（trending页不按时间排列，不使用）
+watermark_file = f"{workdir}/listing_watermarks.json"
+WATERMARK_KEYS = 5
+listing_watermarks = {}
+pending_watermarks = {}  # 本轮解析出的新高水位，新闻处理完后才生效
+listing_stats = {"parsed": 0}
+
+async def send_message_to_lark(message):
     webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/28a08908-d41f-44f5-b27b-58c80ec43cd0"
-    headers = {
-        "Content-Type": "application/json"
-    }
     data = {
         "msg_type": "text",
         "content": {
             "text": message
         }
     }
-    response = requests.post(webhook_url, headers=headers, json=data)
-    print("发送消息状态码:", response.status_code)
-    print("发送消息响应:", response.text)
-    return response.json()
-
-async def query_ollama(messages):
-    """调用Ollama API进行文本生成"""
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "stream": False
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(OLLAMA_API_URL, json=payload) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result["message"]["content"]
-            else:
-                error_text = await response.text()
-                raise Exception(f"Ollama API调用失败: {response.status}, {error_text}")
-
-def parse_news_row_trending(row):
-    # 提取公司标志（logo），这里根据html中class为news-card-logo下的img标签的src属性获取，需根据实际情况调整
-    logo_elem = row.find('div', class_='news-card-logo').find('img')
-    if logo_elem is not None:
-        logo = logo_elem['src']
-    else:
-        logo = "未知"
-    # 提取公司代码（symbol），根据类名为news-card-symbol的a标签文本获取
-    symbol_elem = row.find('a', class_='news-card-symbol symbol-link')
-    if symbol_elem is not None:
-        symbol = symbol_elem.text
-    else:
-        symbol = "未知"
-    # 提取新闻标题（title），根据类名为news-card-title的a标签文本获取，并去除首尾空白字符
-    title_elem = row.find('a', class_='news-card-title')
-    if title_elem is not None:
-        title = title_elem.text.strip()
-    else:
-        title = "未知"
-    # 构造新闻链接（link），根据类名为news-card-title的a标签的href属性结合网站基础域名构造完整链接
-    link_elem = row.find('a', class_='news-card-title')
-    if link_elem is not None:
-        link = "https://www.stocktitan.net" + link_elem['href']
-    else:
-        link = "未知"
-    # 提取新闻正文中相关信息（这里示例中暂未处理，如需提取更多如影响力、情感倾向等，要按网页结构找对应元素来解析，目前html结构中没明显对应展示，可根据实际业务需求完善）
-    # 示例中先简单赋值默认值，你可以后续调整补充获取方式
-    exchange = "未知"
-    time_info = "未知"
-    impact = "未知"
-    sentiment = "未知"
-    news_key = f"{symbol}_{title}"
-
-    return logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key
-
-def parse_news_row(row):
-    # 提取公司标志
-    logo_elem = row.find('img', class_='live-feed-logo')
-    if logo_elem is not None:
-        logo = logo_elem['src']
-    else:
-        logo = "未知"
-    # 提取公司代码和交易所
-    symbol_elem = row.find('a', class_='symbol-link notranslate')
-    if symbol_elem is not None:
-        symbol = symbol_elem.text
-    else:
-        symbol = "未知"
-    exchange = row.find('span', class_='feed-ticker').text.split(':')[1].strip()
-    # 提取新闻标题和链接
-    title_elem = row.find('a', class_='text-gray-dark feed-link')
-    if title_elem is not None:
-        title = title_elem.text.strip()
-        link = "https://www.stocktitan.net" + title_elem['href']
-    else:
-        title = "未知"
-        link = "未知"
-    # 提取时间
-    time_elem1 = row.find('time', class_='news-row-datetime')
-    time_elem2 = row.find('span', class_='news-row-date')
-    if time_elem1 is not None:
-        # time_info = time_elem1.find('span', class_='data').text + " " + time_elem1.find('span', class_='time').text
-        time_info = time_elem1.text.strip().replace('\n', ' ')
-    elif time_elem2 is not None:
-        time_info = time_elem2.text.strip()
-    else:
-        time_info = "未知"
-    # 提取影响力和情感倾向
-    impact_elems = row.find('div', class_='impact-bar').find_all('span', class_='dot full')
-    if impact_elems is not None:
-        impact = len(impact_elems)
-    else:
-        impact = "未知"
-    sentiment_elems = row.find('div', class_='sentiment-bar').find_all('span', class_='dot full')
-    if sentiment_elems is not None:
-        sentiment = len(sentiment_elems)
-    else:
-        sentiment = "未知"
+    status, text = await feishu.send(webhook_url, data)
+    print("发送消息状态码:", status)
+    print("发送消息响应:", text)
+    return text
 
-    news_key = f"{symbol}_{title}"
-    
-    return logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key
+async def query_ollama(messages, response_format=None):
+    """调用Ollama API进行文本生成，response_format="json"时要求模型输出JSON"""
+    return await ollama_client.chat(messages, model=OLLAMA_MODEL, response_format=response_format)
 
+async def translate_text(translate_prompt, text):
+    """翻译文本，同一标题出现在多个列表页或多次出现时直接取缓存的译文"""
+    messages = [
+        {"role": "system", "content": "You are Qwen, you are a great reader and translator!"},
+        {"role": "user", "content": translate_prompt + text}
+    ]
+    translated = await cached_translate(text, OLLAMA_MODEL, translate_prompt, lambda: query_ollama(messages))
+    return translated.strip()
 
-async def process_news_info(crawler, logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, history_news):
+def is_valuable_news(impact, sentiment):
     if impact == "未知" or sentiment == "未知":
-        valuable = True
+        return True
     # elif impact >= 4 and sentiment >= 4:
-    #     valuable = True
+    #     return True
     # elif impact >= 1 and sentiment >= 5:
-    #     valuable = True
+    #     return True
     elif impact >= 5:
-        valuable = True
+        return True
     elif sentiment >= 5 and impact >= 2:
-        valuable = True
+        return True
+    return False
+
+def load_listing_watermarks():
+    global listing_watermarks
+    if os.path.exists(watermark_file):
+        try:
+            with open(watermark_file, "r", encoding="utf-8") as f:
+                listing_watermarks = json.load(f)
+        except ValueError:
+            print(f"高水位文件 {watermark_file} 损坏，本轮解析完整列表")
+
+def commit_listing_watermarks():
+    """本轮的新闻处理完后调用，保存各列表页的新高水位"""
+    listing_watermarks.update(pending_watermarks)
+    pending_watermarks.clear()
+    tmp_file = watermark_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(listing_watermarks, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, watermark_file)
+
+def extract_new_listing_items(url, html_content, page_type):
+    """解析列表页，feed页只解析到上次已处理的位置为止，并记录本页新的高水位"""
+    if page_type == "trending":
+        news_items = extract_news_items(html_content, page_type)
     else:
-        valuable = False
-    if valuable and news_key not in history_news:
-        ###解码link中的新闻具体信息
+        seen_keys = listing_watermarks.get(url, [])
+        news_items = extract_news_items(html_content, page_type, stop_keys=set(seen_keys))
+        if news_items:
+            newest_keys = [news_item.news_key for news_item in reversed(news_items)]
+            pending_watermarks[url] = (newest_keys + seen_keys)[:WATERMARK_KEYS]
+    listing_stats["parsed"] += len(news_items)
+    return news_items
+
+def stage_semaphore(stage):
+    """按阶段获取并发信号量（在事件循环内首次使用时创建）"""
+    if stage not in pipeline_semaphores:
+        pipeline_semaphores[stage] = asyncio.Semaphore(PIPELINE_WORKERS[stage])
+    return pipeline_semaphores[stage]
+
+async def fetch_news_detail(crawler, link):
+    """详情页抓取阶段：解码link中的新闻具体信息"""
+    async with stage_semaphore("detail"):
+        result = await crawler.arun(url=link, cache_mode=CacheMode.BYPASS)
+    soup = BeautifulSoup(result.html, 'html.parser')
+    return soup.find('div', {'id': 'summary', 'lang': 'en'}).get_text()
+
+async def classify_news(news_detail):
+    """条件判断阶段：让模型判断新闻是否满足关注条件"""
+    messages = [
+        {"role": "system", "content": "You are Qwen, a stock trading assistant!"},
+        {"role": "user", "content": "Is the news of a stock about any of the following conditions: " + check_message + ", according to the news? You should just answer yes or no in English, no others words are allowed, and the news is " + news_detail}
+    ]
+    async with stage_semaphore("classify"):
+        # 流式读取，拿到第一个词（yes/no）就停止生成
+        response = await ollama_client.classify(messages, model=OLLAMA_MODEL)
+    # print(f"AI回复：{response}")
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    print(f"{current_time}, news detail: {news_detail}, AI response: {response}")
+    return response == "yes"
+
+def parse_structured_analysis(content):
+    """校验结构化输出，格式不符时抛出ValueError"""
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("结构化输出不是JSON对象")
+    relevant = data.get("relevant")
+    if isinstance(relevant, str) and relevant.strip().lower() in ("yes", "no", "true", "false"):
+        relevant = relevant.strip().lower() in ("yes", "true")
+    if not isinstance(relevant, bool):
+        raise ValueError(f"relevant字段无效: {relevant!r}")
+    matched_conditions = data.get("matched_conditions", [])
+    if not isinstance(matched_conditions, list):
+        raise ValueError(f"matched_conditions字段无效: {matched_conditions!r}")
+    title_cn = data.get("title_cn")
+    summary_cn = data.get("summary_cn")
+    if relevant:
+        if not isinstance(title_cn, str) or not title_cn.strip():
+            raise ValueError("缺少title_cn")
+        if not isinstance(summary_cn, str) or not summary_cn.strip():
+            raise ValueError("缺少summary_cn")
+        title_cn = title_cn.strip()
+        summary_cn = summary_cn.strip()
+    return {
+        "relevant": relevant,
+        "matched_conditions": matched_conditions,
+        "title_cn": title_cn if relevant else None,
+        "summary_cn": summary_cn if relevant else None,
+    }
+
+async def analyze_news_structured(title, news_detail):
+    """结构化输出模式：一次调用同时完成条件判断、标题翻译和详情摘要"""
+    messages = [
+        {"role": "system", "content": "You are Qwen, a stock trading assistant and a great translator! You always answer with a single JSON object."},
+        {"role": "user", "content": "Read the stock news below and decide whether it is about any of the following conditions: " + check_message + ". "
+            "Answer with a JSON object with exactly these keys: "
+            "\"relevant\" (true or false), "
+            "\"matched_conditions\" (list of the numbers of the matched conditions, empty if none), "
+            "\"title_cn\" (the title translated into Chinese), "
+            "\"summary_cn\" (the news translated into Chinese and summarized to a shorter version). "
+            "If relevant is false, set title_cn and summary_cn to empty strings. "
+            "The title is: " + title + "\nThe news is: " + news_detail}
+    ]
+    async with stage_semaphore("classify"):
+        content = await query_ollama(messages, response_format="json")
+    analysis = parse_structured_analysis(content)
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    print(f"{current_time}, news detail: {news_detail}, AI response: relevant={analysis['relevant']}, matched_conditions={analysis['matched_conditions']}")
+    return analysis
+
+async def analyze_news(title, news_detail):
+    """判断阶段：优先使用结构化输出，解析失败时回退到单独的条件判断调用"""
+    if USE_STRUCTURED_OUTPUT:
         try:
-            result = await crawler.arun(url=link, cache_mode=CacheMode.BYPASS)
-            html_content = result.html
-            soup = BeautifulSoup(html_content, 'html.parser')
-            news_detail = soup.find('div', {'id': 'summary', 'lang': 'en'}).get_text()
-            messages = [
-                {"role": "system", "content": "You are Qwen, a stock trading assistant!"},
-                {"role": "user", "content": "Is the news of a stock about any of the following conditions: " + check_message + ", according to the news? You should just answer yes or no in English, no others words are allowed, and the news is " + news_detail}
-            ]
-            response = await query_ollama(messages)
-            # print(f"AI回复：{response}")
-            ###去掉所有符号
-            response = ''.join(e for e in response if e.isalnum()).lower()
-            current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            print(f"{current_time}, news detail: {news_detail}, AI response: {response}")
-            if response == "yes":
-                messages = [
-                    {"role": "system", "content": "You are Qwen, you are a great reader and translator!"},
-                    {"role": "user", "content": "Translate this title into Chinese, return only the translated text, discard all other texts: " + title}
-                ]
-                translated_title = (await query_ollama(messages)).strip()
-
-
-                messages = [
-                    {"role": "system", "content": "You are Qwen, you are a great reader and translator!"},
-                    {"role": "user", "content": "Translate this news into Chinese and summarize to a shorter version, return only the translated shorter version, discard all other texts: " + news_detail}
-                ]
-                translated_news_detail = (await query_ollama(messages)).strip()
-            
-                # 获取股票数据
-                stock = yf.Ticker(symbol)
-                # print(f"股票数据：{stock}")
-                info = stock.info  # 获取股票的基本信息
-                # print(f"股票基本信息：{info}")
-                longBusinessSummary = info['longBusinessSummary'] if 'longBusinessSummary' in info else "未知"
-                if longBusinessSummary != "未知":
-                    messages = [
-                        {"role": "system", "content": "You are Qwen, you are a great reader and translator!"},
-                        {"role": "user", "content": "Translate this message into Chinese, return only the translated text, discard all other texts: " + longBusinessSummary}
-                    ]
-                    longBusinessSummary_cn = (await query_ollama(messages)).strip()
-                else:
-                    longBusinessSummary_cn = "未知"
-                marketCap = info['marketCap'] if'marketCap' in info else "未知"
-                if marketCap != "未知":
-                    marketCap = f"{marketCap/100000000:,.2f}亿"
-                forwardPE = info['forwardPE'] if 'forwardPE' in info else "未知"
-                forwardEps = info['forwardEps'] if 'forwardEps' in info else "未知"
-                dividendYield = info['dividendYield'] if 'dividendYield' in info else "未知"
-                regularMarketPrice = info['regularMarketPrice'] if'regularMarketPrice' in info else "未知"
-                regularMarketChangePercent = info['regularMarketChangePercent'] if'regularMarketChangePercent' in info else "未知"
-                regularMarketChange = info['regularMarketChange'] if'regularMarketChange' in info else "未知"
-                regularMarketOpen = info['regularMarketOpen'] if'regularMarketOpen' in info else "未知"
-                regularMarketDayHigh = info['regularMarketDayHigh'] if'regularMarketDayHigh' in info else "未知"
-                regularMarketDayLow = info['regularMarketDayLow'] if'regularMarketDayLow' in info else "未知"
-
-                current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                news_info = f"推送时间：{current_time}\n"
-                news_info += f"新闻时间：{time_info}\n"
-                # news_info += f"公司标志：{logo}\n"
-                news_info += f"公司代码：{symbol}\n"
-                news_info += f"交易所：{exchange}\n"
-                news_info += f"新闻标题（英文）：{title}\n"
-                news_info += f"新闻标题（中文）：{translated_title}\n"
-                news_info += f"新闻详情（中文）：{translated_news_detail}\n"
-                news_info += f"新闻链接：{link}\n"
-                news_info += f"影响力：{impact}\n"
-                news_info += f"情感倾向：{sentiment}\n"
-                # news_info += f"公司简介：{longBusinessSummary}\n"
-                news_info += f"公司简介（中文）：{longBusinessSummary_cn}\n"
-                news_info += f"市值：{marketCap}\n"
-                news_info += f"PE: {forwardPE}\n"
-                # news_info += f"EPS: {forwardEps}\n"
-                # news_info += f"股息率：{dividendYield}\n"
-                news_info += f"股价：{regularMarketPrice}\n"
-                # news_info += f"涨跌幅：{regularMarketChangePercent}\n"
-                # news_info += f"涨跌额：{regularMarketChange}\n"
-                # news_info += f"开盘价：{regularMarketOpen}\n"
-                # news_info += f"最高价：{regularMarketDayHigh}\n"
-                # news_info += f"最低价：{regularMarketDayLow}\n"
-
-                markdowntext = f"|![{symbol}]({logo}) | {symbol} | {title} (EN) | {translated_title} (CN) | [点击查看]({link}) | {exchange} | {time_info} | {impact} | {sentiment} |\n"
-                with open(markdowntext_file, "a", encoding="utf-8") as f:
-                    f.write(markdowntext)
-                with open(history_file, "a", encoding="utf-8") as f:
-                    f.write(news_key + "\n")
-                send_message_to_lark(news_info)
-                current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                print(f"[{current_time}] 推送新闻：{news_key}，标题：{title}，中文标题：{translated_title}")
-            
+            return await analyze_news_structured(title, news_detail)
+        except ValueError as e:
+            print(f"结构化输出解析失败，回退到多次调用: {e}")
+    return {
+        "relevant": await classify_news(news_detail),
+        "matched_conditions": [],
+        "title_cn": None,
+        "summary_cn": None,
+    }
+
+def fetch_quote(symbol):
+    """通过fast_info刷新行情字段，比完整的info请求轻量得多"""
+    fast_info = yf.Ticker(symbol).fast_info
+    quote = {
+        "regularMarketPrice": fast_info.last_price,
+        "marketCap": fast_info.market_cap,
+        "regularMarketOpen": fast_info.open,
+        "regularMarketDayHigh": fast_info.day_high,
+        "regularMarketDayLow": fast_info.day_low,
+    }
+    previous_close = fast_info.previous_close
+    if fast_info.last_price is not None and previous_close:
+        quote["regularMarketChange"] = fast_info.last_price - previous_close
+        quote["regularMarketChangePercent"] = quote["regularMarketChange"] / previous_close * 100
+    return {key: value for key, value in quote.items() if value is not None}
+
+async def get_ticker_info(symbol):
+    """
+    获取股票基本信息和中文公司简介，返回 (info, longBusinessSummary_cn)
+    缓存命中时不调用模型，行情过期时只做一次轻量的行情刷新
+    yfinance是同步接口，放到线程中执行，避免阻塞其他新闻
+    """
+    lock = ticker_locks.setdefault(symbol, asyncio.Lock())
+    async with lock:
+        profile = ticker_cache.get_profile(symbol)
+        if profile is None:
+            info = await asyncio.to_thread(lambda: yf.Ticker(symbol).info)  # 获取股票的基本信息
+            # print(f"股票基本信息：{info}")
+            longBusinessSummary = info['longBusinessSummary'] if 'longBusinessSummary' in info else "未知"
+            if longBusinessSummary != "未知":
+                longBusinessSummary_cn = await translate_text("Translate this message into Chinese, return only the translated text, discard all other texts: ", longBusinessSummary)
             else:
-                current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                print(f"[{current_time}] 忽略新闻：{news_key}, 标题：{title}")
+                longBusinessSummary_cn = "未知"
+            ticker_cache.put_profile(symbol, info, longBusinessSummary_cn)
+            return info, longBusinessSummary_cn
+
+        info, longBusinessSummary_cn = profile
+        quote = ticker_cache.get_quote(symbol)
+        if quote is None:
+            try:
+                quote = await asyncio.to_thread(fetch_quote, symbol)
+                ticker_cache.put_quote(symbol, quote)
+            except Exception as e:
+                print(f"刷新 {symbol} 行情失败，使用缓存数据: {e}")
+                quote = {}
+        return {**info, **quote}, longBusinessSummary_cn
+
+async def enrich_news_info(logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, news_detail, analysis):
+    """补全阶段：翻译标题和详情（结构化输出已提供时跳过），查询股票数据，组装推送内容"""
+    async with stage_semaphore("enrich"):
+        translated_title = analysis["title_cn"]
+        if translated_title is None:
+            translated_title = await translate_text("Translate this title into Chinese, return only the translated text, discard all other texts: ", title)
+
+        translated_news_detail = analysis["summary_cn"]
+        if translated_news_detail is None:
+            translated_news_detail = await translate_text("Translate this news into Chinese and summarize to a shorter version, return only the translated shorter version, discard all other texts: ", news_detail)
+
+        # 获取股票数据（优先使用本地缓存）
+        info, longBusinessSummary_cn = await get_ticker_info(symbol)
+    marketCap = info['marketCap'] if'marketCap' in info else "未知"
+    if marketCap != "未知":
+        marketCap = f"{marketCap/100000000:,.2f}亿"
+    forwardPE = info['forwardPE'] if 'forwardPE' in info else "未知"
+    forwardEps = info['forwardEps'] if 'forwardEps' in info else "未知"
+    dividendYield = info['dividendYield'] if 'dividendYield' in info else "未知"
+    regularMarketPrice = info['regularMarketPrice'] if'regularMarketPrice' in info else "未知"
+    regularMarketChangePercent = info['regularMarketChangePercent'] if'regularMarketChangePercent' in info else "未知"
+    regularMarketChange = info['regularMarketChange'] if'regularMarketChange' in info else "未知"
+    regularMarketOpen = info['regularMarketOpen'] if'regularMarketOpen' in info else "未知"
+    regularMarketDayHigh = info['regularMarketDayHigh'] if'regularMarketDayHigh' in info else "未知"
+    regularMarketDayLow = info['regularMarketDayLow'] if'regularMarketDayLow' in info else "未知"
+
+    news_info = f"新闻时间：{time_info}\n"
+    # news_info += f"公司标志：{logo}\n"
+    news_info += f"公司代码：{symbol}\n"
+    news_info += f"交易所：{exchange}\n"
+    news_info += f"新闻标题（英文）：{title}\n"
+    news_info += f"新闻标题（中文）：{translated_title}\n"
+    news_info += f"新闻详情（中文）：{translated_news_detail}\n"
+    news_info += f"新闻链接：{link}\n"
+    news_info += f"影响力：{impact}\n"
+    news_info += f"情感倾向：{sentiment}\n"
+    # news_info += f"公司简介：{longBusinessSummary}\n"
+    news_info += f"公司简介（中文）：{longBusinessSummary_cn}\n"
+    news_info += f"市值：{marketCap}\n"
+    news_info += f"PE: {forwardPE}\n"
+    # news_info += f"EPS: {forwardEps}\n"
+    # news_info += f"股息率：{dividendYield}\n"
+    news_info += f"股价：{regularMarketPrice}\n"
+    # news_info += f"涨跌幅：{regularMarketChangePercent}\n"
+    # news_info += f"涨跌额：{regularMarketChange}\n"
+    # news_info += f"开盘价：{regularMarketOpen}\n"
+    # news_info += f"最高价：{regularMarketDayHigh}\n"
+    # news_info += f"最低价：{regularMarketDayLow}\n"
+
+    markdowntext = f"|![{symbol}]({logo}) | {symbol} | {title} (EN) | {translated_title} (CN) | [点击查看]({link}) | {exchange} | {time_info} | {impact} | {sentiment} |\n"
+    return {
+        "news_key": news_key,
+        "title": title,
+        "translated_title": translated_title,
+        "news_info": news_info,
+        "markdowntext": markdowntext,
+    }
+
+async def push_news_info(prepared):
+    """推送阶段：写入本地记录并发送到飞书"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    news_info = f"推送时间：{current_time}\n" + prepared["news_info"]
+    with open(markdowntext_file, "a", encoding="utf-8") as f:
+        f.write(prepared["markdowntext"])
+    await send_message_to_lark(news_info)
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    print(f"[{current_time}] 推送新闻：{prepared['news_key']}，标题：{prepared['title']}，中文标题：{prepared['translated_title']}")
+
+async def process_news_info(crawler, logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key):
+    """单条新闻的抓取、判断、补全阶段，返回待推送内容；不需要推送时返回None"""
+    news_detail = await fetch_news_detail(crawler, link)
+    analysis = await analyze_news(title, news_detail)
+    if not analysis["relevant"]:
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        print(f"[{current_time}] 忽略新闻：{news_key}, 标题：{title}")
+        return None
+    return await enrich_news_info(logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, news_detail, analysis)
+
+async def process_news_rows(crawler, news_items, history_news):
+    """
+    并发处理一批新闻（news_items需按旧→新排列）
+    抓取、判断、补全阶段按PIPELINE_WORKERS限流并发执行，
+    推送阶段按原始顺序逐条进行，某条新闻未就绪时只阻塞其后的推送。
+    """
+    pending = []
+    for news_item in news_items:
+        logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key = news_item
+        if not is_valuable_news(impact, sentiment) or news_key in history_news:
+            continue
+        # 先记录到去重库，避免同一批次或其他页面重复处理同一条新闻
+        history_news.add(news_key)
+        pending.append(asyncio.create_task(process_news_info(crawler, *news_item)))
+
+    for task in pending:
+        try:
+            prepared = await task
+            if prepared is not None:
+                await push_news_info(prepared)
         except Exception as e:
             print(f"处理新闻时发生异常: {e}")
-        history_news.add(news_key)
 
-async def fetch_and_process_news_feed(crawler, history_news, url):
+async def fetch_news_listing(crawler, url, page_type):
+    """抓取并解析单个列表页，失败时返回空列表，不影响其他页面"""
     try:
         result = await crawler.arun(url=url, cache_mode=CacheMode.BYPASS)
-        html_content = result.html
-        soup = BeautifulSoup(html_content, 'html.parser')
-        news_rows = soup.find_all('div', class_='d-flex py-2 news-row feed-border-gradient rounded my-2')
-        
-        for row in news_rows[::-1]:
-            logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key = parse_news_row(row)
-            await process_news_info(crawler, logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, history_news)
+        return extract_new_listing_items(url, result.html, page_type)
     except Exception as e:
-        print(f"爬取或处理新闻时发生异常: {e}")
+        print(f"爬取新闻列表 {url} 时发生异常: {e}")
+        return []
 
-async def fetch_and_process_news_today(crawler, history_news, url):
-    try:
-        result = await crawler.arun(url=url, cache_mode=CacheMode.BYPASS)
-        html_content = result.html
-        soup = BeautifulSoup(html_content, 'html.parser')
-        news_rows = soup.find_all('div', class_='d-flex py-2 news-row feed-border-gradient rounded my-2')
-        for row in news_rows[::-1]:
-            logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key = parse_news_row(row)
-            await process_news_info(crawler, logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, history_news)
-    except Exception as e:
-        print(f"爬取或处理新闻时发生异常: {e}")
+def parse_listing_time(time_info):
+    """把列表页的时间（如 10/17/2026 04:20 PM 或 10/17/2026）转换为时间戳，无法识别时返回None"""
+    for time_format in LISTING_TIME_FORMATS:
+        try:
+            return time.mktime(time.strptime(time_info, time_format))
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def listing_sort_keys(news_items):
+    """
+    为一个页面的新闻（旧→新）计算排序用的时间：无法识别时间的行沿用同页前一行的时间，
+    页首无法识别的行使用同页第一个可识别的时间；整页都没有时间（trending页）时排在最后
+    """
+    times = [parse_listing_time(news_item.time_info) for news_item in news_items]
+    known_times = [t for t in times if t is not None]
+    if not known_times:
+        return [float("inf")] * len(news_items)
+    sort_keys = []
+    last_time = known_times[0]
+    for t in times:
+        if t is not None:
+            last_time = t
+        sort_keys.append(last_time)
+    return sort_keys
 
-async def fetch_and_process_news_trending(crawler, history_news, url):
+async def fetch_merged_news_listing(crawler):
+    """
+    并发抓取所有列表页，合并为一个按news_key去重、按列表时间旧→新排列的待处理队列
+    同一条新闻在多个页面出现时，保留第一条值得处理的记录（live页优先，带有影响力和情感倾向）；
+    时间相同的新闻保持页面顺序，trending页没有时间，排在最后
+    """
+    listings = await asyncio.gather(*(fetch_news_listing(crawler, url, page_type) for url, page_type in news_listing_pages))
+    merged = {}
+    for news_items in listings:
+        for news_item, sort_key in zip(news_items, listing_sort_keys(news_items)):
+            if news_item.news_key in merged or not is_valuable_news(news_item.impact, news_item.sentiment):
+                continue
+            merged[news_item.news_key] = (sort_key, news_item)
+    # sorted是稳定排序，同一时间的新闻保持合并时的顺序
+    return [news_item for _, news_item in sorted(merged.values(), key=lambda entry: entry[0])]
+
+async def fetch_and_process_merged_news(crawler, history_news):
     try:
-        result = await crawler.arun(url=url, cache_mode=CacheMode.BYPASS)
-        html_content = result.html
-        soup = BeautifulSoup(html_content, 'html.parser')
-        # 从trending.html结构来看，新闻条目似乎都在类名为news-card的div中，这里据此提取新闻行元素，可根据实际情况调整
-        news_rows = soup.find_all('div', class_='news-card')
-
-        for row in news_rows:
-            logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key = parse_news_row_trending(row)
-            await process_news_info(crawler, logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key, history_news)
+        pending_watermarks.clear()
+        news_items = await fetch_merged_news_listing(crawler)
+        await process_news_rows(crawler, news_items, history_news)
+        commit_listing_watermarks()
     except Exception as e:
         print(f"爬取或处理新闻时发生异常: {e}")
 
 async def main():
-    history_news = set()
-    try:
-        with open(history_file, "r", encoding="utf-8") as f:
-            history_news.update(line.strip() for line in f)
-    except FileNotFoundError:
-        pass
+    # 已处理新闻的去重库（首次运行时自动从history_news.txt迁移）
+    history_news = open_store(history_db, legacy_file=history_file)
+    load_listing_watermarks()
 
     markdowntext = "| 公司标志 | 公司代码 | 新闻标题 (EN ) | 新闻标题 (CN ) | 新闻链接 | 交易所 | 时间 | 影响 | 情感倾向 |\n"
     markdowntext += "| --- | --- | --- | --- | --- | --- | --- | --- | --- |\n"
     with open(markdowntext_file, "w", encoding="utf-8") as f:
         f.write(markdowntext)
 
-    url1 = "https://www.stocktitan.net/news/live.html"
-    url2 = "https://www.stocktitan.net/news/today"
-    url3 = "https://www.stocktitan.net/news/trending.html"  # 新增要监测的网页地址
     while True:
         try:
             async with AsyncWebCrawler(verbose=True) as crawler:
-                await fetch_and_process_news_feed(crawler, history_news, url1)
-                await fetch_and_process_news_today(crawler, history_news, url2)
-                await fetch_and_process_news_trending(crawler, history_news, url3)  # 调用新的处理函数
+                # 三个列表页并发抓取，合并去重后统一进入处理流水线
+                await fetch_and_process_merged_news(crawler, history_news)
+                history_news.commit()
+                print(ollama_client.get_client().report())
+                print(translation_cache.report())
+                print(f"列表页本轮解析 {listing_stats['parsed']} 条新闻（live/today页解析到上次已处理的行即停止）")
+                listing_stats["parsed"] = 0
                 sleep_time = random.randint(30, 80)
                 print(f"等待 {sleep_time} 秒后继续爬取...")
                 await asyncio.sleep(sleep_time)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+stocktitan列表页（live/today/trending）的解析
+
+- extract_news_items_bs4: 原有的BeautifulSoup解析
+- extract_news_items_lxml: 用lxml和预编译的XPath解析，字段与BeautifulSoup版本一致，CPU开销小得多
+- extract_news_items: 安装了lxml时使用lxml，否则回退到BeautifulSoup
+- live/today页按新→旧排列，传入stop_keys（上次已处理的最新几条news_key）时解析到其中任意一条即停止，
+  没有新新闻的轮询只解析页面顶部的几行
+- lxml版本对live/today页用HTMLPullParser分块增量解析，遇到stop_keys后不再读入后面的HTML，
+  不构建整棵文档树；BeautifulSoup版本仍需解析整个页面，只省去后面各行的字段提取
+
+对比两种解析的速度和结果: python bench_stocknews_parse.py <保存的列表页HTML>...
+"""
+
+from collections import namedtuple
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# 列表页解析出的统一新闻记录，feed页和trending页共用
+NewsItem = namedtuple("NewsItem", ["logo", "symbol", "exchange", "title", "link", "time_info", "impact", "sentiment", "news_key"])
+
+BASE_URL = "https://www.stocktitan.net"
+FEED_ROW_CLASS = "d-flex py-2 news-row feed-border-gradient rounded my-2"
+FEED_CHUNK_SIZE = 16 * 1024  # 增量解析时每次读入的HTML长度
+
+
+def parse_news_row_trending(row):
+    # 提取公司标志（logo），这里根据html中class为news-card-logo下的img标签的src属性获取，需根据实际情况调整
+    logo_elem = row.find('div', class_='news-card-logo').find('img')
+    if logo_elem is not None:
+        logo = logo_elem['src']
+    else:
+        logo = "未知"
+    # 提取公司代码（symbol），根据类名为news-card-symbol的a标签文本获取
+    symbol_elem = row.find('a', class_='news-card-symbol symbol-link')
+    if symbol_elem is not None:
+        symbol = symbol_elem.text
+    else:
+        symbol = "未知"
+    # 提取新闻标题（title），根据类名为news-card-title的a标签文本获取，并去除首尾空白字符
+    title_elem = row.find('a', class_='news-card-title')
+    if title_elem is not None:
+        title = title_elem.text.strip()
+    else:
+        title = "未知"
+    # 构造新闻链接（link），根据类名为news-card-title的a标签的href属性结合网站基础域名构造完整链接
+    link_elem = row.find('a', class_='news-card-title')
+    if link_elem is not None:
+        link = BASE_URL + link_elem['href']
+    else:
+        link = "未知"
+    # 提取新闻正文中相关信息（这里示例中暂未处理，如需提取更多如影响力、情感倾向等，要按网页结构找对应元素来解析，目前html结构中没明显对应展示，可根据实际业务需求完善）
+    # 示例中先简单赋值默认值，你可以后续调整补充获取方式
+    exchange = "未知"
+    time_info = "未知"
+    impact = "未知"
+    sentiment = "未知"
+    news_key = f"{symbol}_{title}"
+
+    return NewsItem(logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key)
+
+
+def parse_news_row(row):
+    # 提取公司标志
+    logo_elem = row.find('img', class_='live-feed-logo')
+    if logo_elem is not None:
+        logo = logo_elem['src']
+    else:
+        logo = "未知"
+    # 提取公司代码和交易所
+    symbol_elem = row.find('a', class_='symbol-link notranslate')
+    if symbol_elem is not None:
+        symbol = symbol_elem.text
+    else:
+        symbol = "未知"
+    exchange = row.find('span', class_='feed-ticker').text.split(':')[1].strip()
+    # 提取新闻标题和链接
+    title_elem = row.find('a', class_='text-gray-dark feed-link')
+    if title_elem is not None:
+        title = title_elem.text.strip()
+        link = BASE_URL + title_elem['href']
+    else:
+        title = "未知"
+        link = "未知"
+    # 提取时间
+    time_elem1 = row.find('time', class_='news-row-datetime')
+    time_elem2 = row.find('span', class_='news-row-date')
+    if time_elem1 is not None:
+        # time_info = time_elem1.find('span', class_='data').text + " " + time_elem1.find('span', class_='time').text
+        # 日期和时间分在两个span中，合并其间的空白（两种解析器保留的空白节点不同）
+        time_info = " ".join(time_elem1.text.split())
+    elif time_elem2 is not None:
+        time_info = time_elem2.text.strip()
+    else:
+        time_info = "未知"
+    # 提取影响力和情感倾向
+    impact_elems = row.find('div', class_='impact-bar').find_all('span', class_='dot full')
+    if impact_elems is not None:
+        impact = len(impact_elems)
+    else:
+        impact = "未知"
+    sentiment_elems = row.find('div', class_='sentiment-bar').find_all('span', class_='dot full')
+    if sentiment_elems is not None:
+        sentiment = len(sentiment_elems)
+    else:
+        sentiment = "未知"
+
+    news_key = f"{symbol}_{title}"
+
+    return NewsItem(logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key)
+
+
+def collect_until_seen(news_items, stop_keys):
+    """news_items按新→旧惰性迭代，遇到stop_keys中的新闻即停止（其后的行不再解析），返回按旧→新排列的列表"""
+    collected = []
+    for news_item in news_items:
+        if stop_keys and news_item.news_key in stop_keys:
+            break
+        collected.append(news_item)
+    return collected[::-1]
+
+
+def extract_news_items_bs4(html_content, page_type, stop_keys=None):
+    """从列表页HTML中解析新闻记录，按旧→新排列"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    if page_type == "trending":
+        # 从trending.html结构来看，新闻条目似乎都在类名为news-card的div中，这里据此提取新闻行元素，可根据实际情况调整
+        news_rows = soup.find_all('div', class_='news-card')
+        return [parse_news_row_trending(row) for row in news_rows]
+    news_rows = soup.find_all('div', class_=FEED_ROW_CLASS)
+    return collect_until_seen((parse_news_row(row) for row in news_rows), stop_keys)
+
+
+def has_class(name):
+    """与BeautifulSoup的 class_='xxx' 相同：class列表中包含该类名"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def class_is(value):
+    """与BeautifulSoup的 class_='a b' 相同：整个class属性等于该字符串"""
+    return f"normalize-space(@class)='{value}'"
+
+
+if lxml is not None:
+    # 选择器只编译一次，每行、每次轮询都复用
+    XPATHS = {
+        "trending_rows": etree.XPath(f"//div[{has_class('news-card')}]"),
+        "feed_logo": etree.XPath(f".//img[{has_class('live-feed-logo')}]"),
+        "feed_symbol": etree.XPath(f".//a[{class_is('symbol-link notranslate')}]"),
+        "feed_ticker": etree.XPath(f".//span[{has_class('feed-ticker')}]"),
+        "feed_title": etree.XPath(f".//a[{class_is('text-gray-dark feed-link')}]"),
+        "feed_datetime": etree.XPath(f".//time[{has_class('news-row-datetime')}]"),
+        "feed_date": etree.XPath(f".//span[{has_class('news-row-date')}]"),
+        "impact_bar": etree.XPath(f".//div[{has_class('impact-bar')}]"),
+        "sentiment_bar": etree.XPath(f".//div[{has_class('sentiment-bar')}]"),
+        "full_dots": etree.XPath(f".//span[{class_is('dot full')}]"),
+        "trending_logo": etree.XPath(f".//div[{has_class('news-card-logo')}]"),
+        "img": etree.XPath(".//img"),
+        "trending_symbol": etree.XPath(f".//a[{class_is('news-card-symbol symbol-link')}]"),
+        "trending_title": etree.XPath(f".//a[{has_class('news-card-title')}]"),
+    }
+
+
+def first(name, element):
+    found = XPATHS[name](element)
+    return found[0] if found else None
+
+
+def parse_news_row_lxml(row):
+    """parse_news_row的lxml版本，返回相同的字段"""
+    logo_elem = first("feed_logo", row)
+    logo = logo_elem.attrib['src'] if logo_elem is not None else "未知"
+    symbol_elem = first("feed_symbol", row)
+    symbol = symbol_elem.text_content() if symbol_elem is not None else "未知"
+    exchange = first("feed_ticker", row).text_content().split(':')[1].strip()
+    title_elem = first("feed_title", row)
+    if title_elem is not None:
+        title = title_elem.text_content().strip()
+        link = BASE_URL + title_elem.attrib['href']
+    else:
+        title = "未知"
+        link = "未知"
+    time_elem1 = first("feed_datetime", row)
+    if time_elem1 is not None:
+        time_info = " ".join(time_elem1.text_content().split())
+    else:
+        time_elem2 = first("feed_date", row)
+        time_info = time_elem2.text_content().strip() if time_elem2 is not None else "未知"
+    impact = len(XPATHS["full_dots"](first("impact_bar", row)))
+    sentiment = len(XPATHS["full_dots"](first("sentiment_bar", row)))
+    news_key = f"{symbol}_{title}"
+    return NewsItem(logo, symbol, exchange, title, link, time_info, impact, sentiment, news_key)
+
+
+def parse_news_row_trending_lxml(row):
+    """parse_news_row_trending的lxml版本，返回相同的字段"""
+    logo_elem = first("img", first("trending_logo", row))
+    logo = logo_elem.attrib['src'] if logo_elem is not None else "未知"
+    symbol_elem = first("trending_symbol", row)
+    symbol = symbol_elem.text_content() if symbol_elem is not None else "未知"
+    title_elem = first("trending_title", row)
+    if title_elem is not None:
+        title = title_elem.text_content().strip()
+        link = BASE_URL + title_elem.attrib['href']
+    else:
+        title = "未知"
+        link = "未知"
+    news_key = f"{symbol}_{title}"
+    return NewsItem(logo, symbol, "未知", title, link, "未知", "未知", "未知", news_key)
+
+
+def iter_feed_rows_lxml(html_content):
+    """
+    分块读入live/today页HTML，每解析完一个新闻行就产出一条记录
+    调用方停止迭代后剩余的HTML不再解析
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag="div")
+    parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())  # 使元素支持text_content()
+    for start in range(0, len(html_content), FEED_CHUNK_SIZE):
+        parser.feed(html_content[start:start + FEED_CHUNK_SIZE])
+        yield from feed_rows_from_events(parser)
+    parser.close()
+    yield from feed_rows_from_events(parser)
+
+
+def feed_rows_from_events(parser):
+    for _, element in parser.read_events():
+        if " ".join(element.get("class", "").split()) == FEED_ROW_CLASS:
+            yield parse_news_row_lxml(element)
+
+
+def extract_news_items_lxml(html_content, page_type, stop_keys=None):
+    """extract_news_items_bs4的lxml版本，按旧→新排列"""
+    if page_type == "trending":
+        root = lxml.html.fromstring(html_content)
+        return [parse_news_row_trending_lxml(row) for row in XPATHS["trending_rows"](root)]
+    return collect_until_seen(iter_feed_rows_lxml(html_content), stop_keys)
+
+
+def extract_news_items(html_content, page_type, stop_keys=None):
+    """从列表页HTML中解析新闻记录，按旧→新排列；安装了lxml时使用lxml"""
+    if lxml is not None:
+        return extract_news_items_lxml(html_content, page_type, stop_keys)
+    return extract_news_items_bs4(html_content, page_type, stop_keys)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检查stocktitan列表页的BeautifulSoup解析与lxml解析结果一致
+
+测试页面保存在 fixtures/ 下：stocktitan_live.html（live/today页结构）、stocktitan_trending.html
+运行: python -m pytest test_stocktitan_parser.py
+"""
+
+import os
+
+import pytest
+
+import stocktitan_parser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+pytestmark = pytest.mark.skipif(stocktitan_parser.lxml is None, reason="未安装lxml")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_live_page_fields_match():
+    html_content = load_fixture("stocktitan_live.html")
+    bs4_items = stocktitan_parser.extract_news_items_bs4(html_content, "feed")
+    assert len(bs4_items) == 6
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "feed") == bs4_items
+
+
+def test_live_page_fields_match_with_stop_keys():
+    html_content = load_fixture("stocktitan_live.html")
+    all_items = stocktitan_parser.extract_news_items_bs4(html_content, "feed")
+    # 按旧→新排列，最后一条是页面顶部的最新新闻
+    for stop_index in range(len(all_items)):
+        stop_keys = {all_items[stop_index].news_key}
+        bs4_items = stocktitan_parser.extract_news_items_bs4(html_content, "feed", stop_keys)
+        assert bs4_items == all_items[stop_index + 1:]
+        assert stocktitan_parser.extract_news_items_lxml(html_content, "feed", stop_keys) == bs4_items
+    stop_keys = {"不存在_的新闻"}
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "feed", stop_keys) == all_items
+
+
+def test_live_page_stop_keys_across_chunks(monkeypatch):
+    # 分块小于一行时，行跨越多个分块也要完整解析
+    monkeypatch.setattr(stocktitan_parser, "FEED_CHUNK_SIZE", 97)
+    html_content = load_fixture("stocktitan_live.html")
+    all_items = stocktitan_parser.extract_news_items_bs4(html_content, "feed")
+    stop_keys = {all_items[2].news_key}
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "feed") == all_items
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "feed", stop_keys) == all_items[3:]
+
+
+def test_trending_page_fields_match():
+    html_content = load_fixture("stocktitan_trending.html")
+    bs4_items = stocktitan_parser.extract_news_items_bs4(html_content, "trending")
+    assert len(bs4_items) == 4
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "trending") == bs4_items
+    stop_keys = {bs4_items[0].news_key}
+    assert stocktitan_parser.extract_news_items_lxml(html_content, "trending", stop_keys) == bs4_items
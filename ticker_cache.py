@@ -0,0 +1,94 @@
+import json
+import sqlite3
+import threading
+import time
+
+# 行情类字段，变化快，单独缓存并使用较短的有效期
+QUOTE_FIELDS = [
+    "marketCap",
+    "regularMarketPrice",
+    "regularMarketChange",
+    "regularMarketChangePercent",
+    "regularMarketOpen",
+    "regularMarketDayHigh",
+    "regularMarketDayLow",
+]
+
+
+class TickerInfoCache:
+    """
+    股票信息的本地SQLite缓存，按股票代码存储
+    - 公司资料（yfinance的info快照 + 翻译后的公司简介）：变化很慢，profile_ttl较长
+    - 行情（价格、市值等QUOTE_FIELDS）：变化快，quote_ttl较短
+    """
+
+    def __init__(self, db_file, profile_ttl=30 * 24 * 3600, quote_ttl=300):
+        self.db_file = db_file
+        self.profile_ttl = profile_ttl
+        self.quote_ttl = quote_ttl
+        self.lock = threading.Lock()  # 允许在asyncio.to_thread的工作线程中使用
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ticker_info (
+                symbol TEXT PRIMARY KEY,
+                info_json TEXT NOT NULL,
+                summary_cn TEXT,
+                profile_updated REAL NOT NULL,
+                quote_json TEXT,
+                quote_updated REAL
+            )
+        """)
+        self.conn.commit()
+
+    def get_profile(self, symbol):
+        """返回 (info, summary_cn)，不存在或已过期时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT info_json, summary_cn, profile_updated FROM ticker_info WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.profile_ttl:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put_profile(self, symbol, info, summary_cn):
+        """保存公司资料，同时用info中的行情字段刷新行情缓存"""
+        now = time.time()
+        quote = {key: info[key] for key in QUOTE_FIELDS if key in info}
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO ticker_info (symbol, info_json, summary_cn, profile_updated, quote_json, quote_updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    info_json = excluded.info_json,
+                    summary_cn = excluded.summary_cn,
+                    profile_updated = excluded.profile_updated,
+                    quote_json = excluded.quote_json,
+                    quote_updated = excluded.quote_updated
+                """,
+                (symbol, json.dumps(info, ensure_ascii=False, default=str), summary_cn, now, json.dumps(quote), now),
+            )
+            self.conn.commit()
+
+    def get_quote(self, symbol):
+        """返回缓存的行情字段，不存在或已过期时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT quote_json, quote_updated FROM ticker_info WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        if row is None or row[0] is None or time.time() - row[1] > self.quote_ttl:
+            return None
+        return json.loads(row[0])
+
+    def put_quote(self, symbol, quote):
+        """刷新行情缓存（公司资料需已存在）"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE ticker_info SET quote_json = ?, quote_updated = ? WHERE symbol = ?",
+                (json.dumps(quote), time.time(), symbol),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各转发脚本共用的翻译缓存
+
+同一条标题或推文经常被重复翻译：多个账号转推同一条推文、彭博/路透同一条新闻出现在多个RSSHub路由、
+stocknews的标题同时出现在live和trending页面。缓存按内容寻址：
+    sha256(模型 + 提示词 + 规范化后的原文) -> 译文
+- 内存中保留一个LRU缓存
+- SQLite磁盘缓存，多个脚本（进程）共用同一个库文件
+- 同一进程内并发请求同一原文时只翻译一次
+
+用法:
+    from translation_cache import cached_translate
+    translated = await cached_translate(text, model, prompt, lambda: query_model(prompt + text))
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+TRANSLATION_CACHE_DB = os.getenv("TRANSLATION_CACHE_DB", "translation_cache/translations.db")
+DEFAULT_TTL = 90 * 24 * 3600  # 译文保留90天，模型或提示词变化时键也会变化
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """统一全角半角、去掉首尾空白、合并连续空白，使仅排版不同的原文命中同一条缓存"""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text, model, prompt):
+    raw = "\0".join([model, prompt, normalize_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    两级翻译缓存
+    memory_size: 内存LRU缓存的条数上限
+    ttl: 磁盘缓存中译文的有效期（秒），None表示永不过期
+    """
+
+    def __init__(self, db_file, memory_size=2000, ttl=DEFAULT_TTL):
+        self.db_file = db_file
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.inflight = {}
+        self.stats = {"memory_hit": 0, "disk_hit": 0, "miss": 0}
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # 内存LRU、统计和SQLite连接都由这把锁保护：ingest_daemon中同步数据源的线程与事件循环线程共用同一个缓存
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")  # 多个脚本同时读写
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, output TEXT NOT NULL, created REAL NOT NULL) WITHOUT ROWID")
+        self.conn.commit()
+
+    def _remember(self, key, output):
+        # 调用方需持有self.lock
+        self.memory[key] = output
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, text, model, prompt):
+        """返回缓存的译文，未命中时返回None"""
+        return self._get(cache_key(text, model, prompt))
+
+    def _get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hit"] += 1
+                return self.memory[key]
+            row = self.conn.execute("SELECT output, created FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.ttl is None or time.time() - row[1] <= self.ttl):
+                self._remember(key, row[0])
+                self.stats["disk_hit"] += 1
+                return row[0]
+            self.stats["miss"] += 1
+            return None
+
+    def put(self, text, model, prompt, output):
+        self._put(cache_key(text, model, prompt), output)
+
+    def _put(self, key, output):
+        with self.lock:
+            self._remember(key, output)
+            self.conn.execute("INSERT OR REPLACE INTO translations (key, output, created) VALUES (?, ?, ?)", (key, output, time.time()))
+            self.conn.commit()
+
+    async def translate(self, text, model, prompt, translate_fn):
+        """
+        命中缓存时直接返回译文，否则调用 translate_fn()（返回译文的协程）并写入缓存
+        translate_fn抛出的异常原样抛出，失败结果不会被缓存
+        """
+        key = cache_key(text, model, prompt)
+        output = self._get(key)
+        if output is not None:
+            return output
+        if key in self.inflight:
+            return await asyncio.shield(self.inflight[key])
+        task = asyncio.ensure_future(translate_fn())
+        self.inflight[key] = task
+        try:
+            output = await task
+        finally:
+            self.inflight.pop(key, None)
+        self._put(key, output)
+        return output
+
+    def translate_sync(self, text, model, prompt, translate_fn):
+        """translate的同步版本，translate_fn为普通函数"""
+        key = cache_key(text, model, prompt)
+        output = self._get(key)
+        if output is not None:
+            return output
+        output = translate_fn()
+        self._put(key, output)
+        return output
+
+    def expire(self):
+        """删除过期的译文，返回删除条数"""
+        if self.ttl is None:
+            return 0
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.ttl,))
+            self.conn.commit()
+        return cursor.rowcount
+
+    def report(self):
+        """返回命中率统计字符串，供各脚本在每轮结束时打印"""
+        with self.lock:
+            stats = dict(self.stats)
+        hits = stats["memory_hit"] + stats["disk_hit"]
+        total = hits + stats["miss"]
+        rate = hits / total * 100 if total else 0
+        return f"翻译缓存: 命中 {hits}/{total} 次（{rate:.1f}%，内存 {stats['memory_hit']}，磁盘 {stats['disk_hit']}）"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+default_cache = None
+default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """进程内共用的默认缓存，可在多个线程中调用"""
+    global default_cache
+    with default_cache_lock:
+        if default_cache is None:
+            default_cache = TranslationCache(TRANSLATION_CACHE_DB)
+            default_cache.expire()
+        return default_cache
+
+
+async def cached_translate(text, model, prompt, translate_fn):
+    return await get_cache().translate(text, model, prompt, translate_fn)
+
+
+def cached_translate_sync(text, model, prompt, translate_fn):
+    return get_cache().translate_sync(text, model, prompt, translate_fn)
+
+
+def report():
+    return get_cache().report()
@@ -10,24 +10,185 @@
 示例:
     python ximalaya_downloader.py 12891461
     python ximalaya_downloader.py https://www.ximalaya.com/album/12891461
+    python ximalaya_downloader.py --batch=albums.txt --sync   # 批量增量同步多个专辑
 """
 
 import os
 import re
 import sys
 import json
+import math
+import hashlib
+import itertools
 import time
+import threading
 import requests
 import qrcode
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Iterable
 from io import BytesIO
 import base64
 
 
+class TrackListError(Exception):
+    """
+    所有音频列表接口都请求失败，与列表确实为空（已到最后一页）区分
+    """
+
+
+class RateLimiter:
+    """
+    线程安全的限速器，相邻两次请求之间至少间隔 min_interval 秒
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+    
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.min_interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class EndpointHealth:
+    """
+    记录各个接口最近的成败，最近成功过的接口排在前面，连续失败的接口排到后面
+    """
+    def __init__(self, endpoints: List[str]):
+        self.endpoints = endpoints
+        self.lock = threading.Lock()
+        self.stats = {endpoint: {'success': 0, 'failure': 0, 'consecutive_failures': 0, 'last_success': 0.0}
+                      for endpoint in endpoints}
+    
+    def record(self, endpoint: str, ok: bool):
+        with self.lock:
+            stat = self.stats[endpoint]
+            if ok:
+                stat['success'] += 1
+                stat['consecutive_failures'] = 0
+                stat['last_success'] = time.time()
+            else:
+                stat['failure'] += 1
+                stat['consecutive_failures'] += 1
+    
+    def ranked(self) -> List[str]:
+        with self.lock:
+            return sorted(self.endpoints, key=lambda endpoint: (self.stats[endpoint]['consecutive_failures'],
+                                                                -self.stats[endpoint]['last_success'],
+                                                                self.endpoints.index(endpoint)))
+    
+    def report(self) -> str:
+        with self.lock:
+            return ", ".join(f"{endpoint} 成功{stat['success']}次/失败{stat['failure']}次"
+                             for endpoint, stat in self.stats.items())
+
+
+def audio_url_expiry(audio_url: str, default_ttl: int = 3600) -> float:
+    """
+    下载地址的过期时间：优先取地址中的过期参数，没有时按 default_ttl 秒估计
+    """
+    params = parse_qs(urlparse(audio_url).query)
+    for key in ('expire', 'expires', 'Expires', 'deadline'):
+        value = params.get(key, [''])[0]
+        if value.isdigit():
+            value = int(value)
+            return value / 1000 if value > 10 ** 12 else value
+    return time.time() + default_ttl
+
+
+def file_sha256(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class AlbumManifest:
+    """
+    专辑清单，保存在专辑下载目录的 manifest.json 中
+    每个音频记录序号、标题、下载地址及其过期时间、文件名、大小、sha256和状态（pending/done/failed）
+    """
+    def __init__(self, path: str, album_id: str):
+        self.path = path
+        self.data = {'album_id': album_id, 'tracks': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except ValueError:
+                print(f"清单文件 {path} 损坏，重新生成")
+    
+    @property
+    def tracks(self) -> Dict[str, Dict]:
+        return self.data['tracks']
+    
+    def update(self, track: Dict, **fields):
+        entry = self.tracks.setdefault(str(track['track_id']), {})
+        entry.update(index=track['index'], title=track['title'], is_free=track['is_free'], **fields)
+    
+    def is_done(self, track_id: str) -> bool:
+        """
+        已下载完成且文件仍在，不需要再获取下载地址
+        """
+        entry = self.tracks.get(track_id, {})
+        return (entry.get('status') == 'done' and bool(entry.get('file'))
+                and os.path.exists(os.path.join(os.path.dirname(self.path), entry['file'])))
+    
+    def cached_url(self, track_id: str) -> Optional[str]:
+        """
+        清单中尚未过期的下载地址
+        """
+        entry = self.tracks.get(track_id, {})
+        if entry.get('audio_url') and entry.get('url_expires', 0) > time.time() + 60:
+            return entry['audio_url']
+        return None
+    
+    def unfinished_tracks(self) -> List[Dict]:
+        """
+        未完成的音频（失败、未下载或文件已被删除），按序号排列
+        """
+        return [dict(track_id=track_id, index=entry['index'], title=entry['title'], is_free=entry['is_free'])
+                for track_id, entry in sorted(self.tracks.items(), key=lambda item: item[1]['index'])
+                if not self.is_done(track_id)]
+    
+    def save(self):
+        self.data['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """
+    把一个可迭代对象按 size 个一组切分，边迭代边返回
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 class XimalayaDownloader:
-    def __init__(self):
+    # 获取音频地址的接口，默认按此顺序尝试，之后按健康情况调整
+    AUDIO_URL_ENDPOINTS = ['tracks_https', 'tracks_http', 'revision_audio', 'mobile_base_info', 'track_simple']
+    # 增量同步时一页音频列表获取失败后的重试次数，仍失败则本次不处理新音频
+    PAGE_RETRIES = 2
+    
+    def __init__(self, page_workers: int = 4, api_interval: float = 0.2, download_workers: int = 4,
+                 host_interval: float = 0.5, resolve_workers: int = 8, race_width: int = 2,
+                 endpoint_timeout: float = 5):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'application/json, text/plain, */*',
@@ -45,6 +206,22 @@ class XimalayaDownloader:
         self.session.headers.update(self.headers)
         self.cookie_file = 'ximalaya_cookies.json'
         self.is_logged_in = False
+        # 分页获取音频列表的并发数，以及所有列表请求共用的限速（替代原来每页之后的固定休眠）
+        self.page_workers = page_workers
+        self.api_limiter = RateLimiter(api_interval)
+        # 并发下载的线程数，以及同一个音频服务器相邻两次下载请求的最短间隔（替代原来每个文件之后的固定休眠）
+        self.download_workers = download_workers
+        self.host_interval = host_interval
+        self.host_limiters = {}
+        self.lock = threading.Lock()
+        # 批量获取音频地址的并发数，以及每个音频同时请求的接口数
+        self.resolve_workers = resolve_workers
+        self.race_width = race_width
+        # 所有音频共用一个抢先请求线程池：requests无法中途取消已发出的请求，落后的请求只能等其返回或超时，
+        # 固定大小的线程池限制同时挂起的请求数，某个接口阻塞时不会无限堆积；单个接口的超时也相应缩短
+        self.race_executor = ThreadPoolExecutor(max_workers=resolve_workers * race_width)
+        self.endpoint_timeout = endpoint_timeout
+        self.endpoint_health = EndpointHealth(self.AUDIO_URL_ENDPOINTS)
         self.load_cookies()
         
     def load_cookies(self):
@@ -432,16 +609,30 @@ class XimalayaDownloader:
         except Exception as e:
             raise Exception(f"获取专辑信息失败: {str(e)}")
     
-    def get_track_list(self, album_id: str, page_num: int = 1, page_size: int = 30) -> List[Dict]:
+    def get_track_list(self, album_id: str, page_num: int = 1, page_size: int = 30, sort: int = 1,
+                       raise_on_error: bool = False) -> List[Dict]:
         """
         获取专辑音频列表
+        所有接口都失败时返回空列表；raise_on_error为True时抛出TrackListError，以便与空页区分
+        """
+        try:
+            return self._get_track_list_main(album_id, page_num, page_size, sort)
+        except TrackListError as e:
+            if raise_on_error:
+                raise
+            print(str(e))
+            return []
+    
+    def _get_track_list_main(self, album_id: str, page_num: int = 1, page_size: int = 30, sort: int = 1) -> List[Dict]:
+        """
+        主API获取音频列表，失败时依次尝试备用方法
         """
         url = f'https://www.ximalaya.com/revision/album/v1/getTracksList'
         params = {
             'albumId': album_id,
             'pageNum': page_num,
             'pageSize': page_size,
-            'sort': 1  # 1: 正序, -1: 倒序
+            'sort': sort  # 1: 正序, -1: 倒序
         }
         
         try:
@@ -454,7 +645,7 @@ class XimalayaDownloader:
             
             if data.get('ret') != 200:
                 # 尝试备用API
-                return self._get_track_list_backup(album_id, page_num, page_size)
+                return self._get_track_list_backup(album_id, page_num, page_size, sort)
                 
             tracks = []
             if 'data' in data:
@@ -463,7 +654,7 @@ class XimalayaDownloader:
                     print(f"找到tracks字段，包含 {len(data['data']['tracks'])} 个音频")
                     if len(data['data']['tracks']) == 0:
                         print("tracks为空，尝试备用API")
-                        return self._get_track_list_backup(album_id, page_num, page_size)
+                        return self._get_track_list_backup(album_id, page_num, page_size, sort)
                     for track in data['data']['tracks']:
                         tracks.append({
                             'track_id': track['trackId'],
@@ -474,14 +665,16 @@ class XimalayaDownloader:
                         })
                 else:
                     print("未找到tracks字段，尝试备用API")
-                    return self._get_track_list_backup(album_id, page_num, page_size)
+                    return self._get_track_list_backup(album_id, page_num, page_size, sort)
             
             return tracks
+        except TrackListError:
+            raise
         except Exception as e:
             print(f"主API失败，尝试备用方法: {str(e)}")
-            return self._get_track_list_backup(album_id, page_num, page_size)
+            return self._get_track_list_backup(album_id, page_num, page_size, sort)
     
-    def _get_track_list_backup(self, album_id: str, page_num: int = 1, page_size: int = 30) -> List[Dict]:
+    def _get_track_list_backup(self, album_id: str, page_num: int = 1, page_size: int = 30, sort: int = 1) -> List[Dict]:
         """
         备用的音频列表获取方法 - 使用Web API
         """
@@ -490,7 +683,7 @@ class XimalayaDownloader:
             'albumId': album_id,
             'pageNum': page_num,
             'pageSize': page_size,
-            'sort': 1
+            'sort': sort
         }
         
         try:
@@ -503,7 +696,7 @@ class XimalayaDownloader:
             
             if data.get('ret') != 200:
                 # 尝试第二个备用API
-                return self._get_track_list_backup2(album_id, page_num, page_size)
+                return self._get_track_list_backup2(album_id, page_num, page_size, sort)
                 
             tracks = []
             if 'data' in data:
@@ -520,14 +713,16 @@ class XimalayaDownloader:
                         })
                 else:
                     print("备用API未找到tracks字段或为空，尝试第二个备用API")
-                    return self._get_track_list_backup2(album_id, page_num, page_size)
+                    return self._get_track_list_backup2(album_id, page_num, page_size, sort)
             
             return tracks
+        except TrackListError:
+            raise
         except Exception as e:
             print(f"第一个备用API失败: {str(e)}")
-            return self._get_track_list_backup2(album_id, page_num, page_size)
+            return self._get_track_list_backup2(album_id, page_num, page_size, sort)
     
-    def _get_track_list_backup2(self, album_id: str, page_num: int = 1, page_size: int = 30) -> List[Dict]:
+    def _get_track_list_backup2(self, album_id: str, page_num: int = 1, page_size: int = 30, sort: int = 1) -> List[Dict]:
         """
         第二个备用的音频列表获取方法 - 使用移动端API
         """
@@ -536,7 +731,7 @@ class XimalayaDownloader:
             'albumId': album_id,
             'pageId': page_num,
             'pageSize': page_size,
-            'sort': 1
+            'sort': sort
         }
         
         try:
@@ -561,130 +756,273 @@ class XimalayaDownloader:
                 print(f"移动端API数据结构: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
                 if 'data' in data:
                     print(f"移动端API data字段: {list(data['data'].keys()) if isinstance(data['data'], dict) else 'Not a dict'}")
+                raise TrackListError(f"获取音频列表失败 (album_id: {album_id}, 第{page_num}页): 移动端API返回 {data.get('ret')}")
             
             return tracks
+        except TrackListError:
+            raise
         except Exception as e:
             print(f"移动端API失败: {str(e)}")
-            return []
+            raise TrackListError(f"获取音频列表失败 (album_id: {album_id}, 第{page_num}页): {str(e)}") from e
     
-    def get_all_tracks(self, album_id: str) -> List[Dict]:
+    def _fetch_page(self, album_id: str, page_num: int, page_size: int, sort: int = 1,
+                    raise_on_error: bool = False) -> List[Dict]:
         """
-        获取专辑所有音频
+        限速后获取一页音频列表
+        raise_on_error为True时失败后重试 PAGE_RETRIES 次，仍失败则抛出TrackListError，不把失败当作空页
         """
-        all_tracks = []
-        page_num = 1
-        page_size = 30
+        retries = self.PAGE_RETRIES if raise_on_error else 0
+        for attempt in range(retries + 1):
+            self.api_limiter.wait()
+            try:
+                return self.get_track_list(album_id, page_num, page_size, sort, raise_on_error=raise_on_error)
+            except TrackListError as e:
+                if attempt == retries:
+                    raise
+                print(f"{str(e)}，{2 ** attempt} 秒后重试")
+                time.sleep(2 ** attempt)
+    
+    def iter_tracks(self, album_id: str, total_count: int = 0, page_size: int = 30) -> Iterator[Dict]:
+        """
+        按顺序逐个返回专辑音频，边获取边返回
+        已知总数时先算出页数，用线程池并发获取各页，按页码顺序、页内按index顺序返回，
+        不必等所有页都获取完才开始下载
+        """
+        page_count = math.ceil(total_count / page_size) if total_count else 0
+        last_page_size = 0
         
+        if page_count:
+            with ThreadPoolExecutor(max_workers=self.page_workers) as executor:
+                futures = {executor.submit(self._fetch_page, album_id, page_num, page_size): page_num
+                           for page_num in range(1, page_count + 1)}
+                pages = {}
+                next_page = 1
+                for future in as_completed(futures):
+                    pages[futures[future]] = future.result()
+                    # 前面的页都到齐后才返回，保证顺序
+                    while next_page in pages:
+                        tracks = pages.pop(next_page)
+                        last_page_size = len(tracks)
+                        yield from sorted(tracks, key=lambda track: track['index'])
+                        next_page += 1
+            if last_page_size < page_size:
+                return
+        
+        # 总数未知，或专辑在获取信息之后又有更新（最后一页是满的），继续逐页获取
+        page_num = page_count + 1
         while True:
-            tracks = self.get_track_list(album_id, page_num, page_size)
-            if not tracks:
-                break
-                
-            all_tracks.extend(tracks)
-            
+            tracks = self._fetch_page(album_id, page_num, page_size)
+            yield from sorted(tracks, key=lambda track: track['index'])
             if len(tracks) < page_size:
                 break
-                
             page_num += 1
-            time.sleep(0.5)  # 避免请求过快
-            
-        return all_tracks
+    
+    def iter_new_tracks(self, album_id: str, known_track_ids: set, page_size: int = 30) -> Iterator[Dict]:
+        """
+        从最新的音频开始倒序逐页获取，遇到清单中已有的音频即停止，只返回新增的音频
+        某一页重试后仍获取失败时抛出TrackListError，而不是当作已到列表末尾
+        """
+        page_num = 1
+        while True:
+            tracks = self._fetch_page(album_id, page_num, page_size, sort=-1, raise_on_error=True)
+            for track in tracks:
+                if str(track['track_id']) in known_track_ids:
+                    return
+                yield track
+            if len(tracks) < page_size:
+                return
+            page_num += 1
+    
+    def get_all_tracks(self, album_id: str, total_count: int = 0) -> List[Dict]:
+        """
+        获取专辑所有音频
+        """
+        return list(self.iter_tracks(album_id, total_count))
     
     def get_audio_url(self, track_id: str) -> Optional[str]:
         """
         获取音频真实下载地址
+        按接口的近期健康情况排序，每次同时请求排在最前的 race_width 个接口，先拿到地址的为准；
+        都失败时再尝试后面的接口
         """
-        # 尝试多个API端点
-        apis = [
-            # 经典的tracks API，从Chrome插件项目中发现
-            f'https://www.ximalaya.com/tracks/{track_id}.json',
-            f'http://www.ximalaya.com/tracks/{track_id}.json',
-            # 其他备用API
-            'https://www.ximalaya.com/revision/play/v1/audio',
-            'https://mobile.ximalaya.com/mobile/v1/track/baseInfo',
-            'https://www.ximalaya.com/revision/track/simple'
-        ]
-        
-        for i, api_url in enumerate(apis):
-            try:
-                if i < 2:  # tracks API
-                    response = self.session.get(api_url, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    # 检查tracks API的响应格式
-                    if 'play_path_64' in data:
-                        return data['play_path_64']
-                    elif 'play_path_32' in data:
-                        return data['play_path_32']
-                    elif 'play_path' in data:
-                        return data['play_path']
-                        
-                elif i == 2:  # revision API
-                    params = {'id': track_id, 'ptype': 1}
-                    response = self.session.get(api_url, params=params, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if data.get('ret') == 200 and 'data' in data and 'src' in data['data']:
-                        return data['data']['src']
-                        
-                elif i == 3:  # mobile API
-                    params = {'trackId': track_id}
-                    response = self.session.get(api_url, params=params, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if data.get('ret') == 0 and 'data' in data:
-                        if 'playUrl' in data['data']:
-                            return data['data']['playUrl']
-                        elif 'src' in data['data']:
-                            return data['data']['src']
-                            
-                elif i == 4:  # track simple API
-                    params = {'trackId': track_id}
-                    response = self.session.get(api_url, params=params, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if data.get('ret') == 200 and 'data' in data:
-                        if 'playPath64' in data['data']:
-                            return data['data']['playPath64']
-                        elif 'src' in data['data']:
-                            return data['data']['src']
-                
-                if i == 0:  # 只在第一个API失败时打印详细信息
-                    print(f"API {i+1} 响应 (track_id: {track_id}): keys={list(data.keys()) if isinstance(data, dict) else 'Not dict'}")
-                    
-            except Exception as e:
-                if i == 0:  # 只在第一个API失败时打印错误
-                    print(f"获取音频地址异常 (track_id: {track_id}): {str(e)}")
-                continue
+        ranked = self.endpoint_health.ranked()
+        for start in range(0, len(ranked), self.race_width):
+            audio_url = self._race_endpoints(ranked[start:start + self.race_width], track_id)
+            if audio_url:
+                return audio_url
         
         print(f"所有API都无法获取音频地址 (track_id: {track_id})")
         return None
     
-    def download_audio(self, audio_url: str, file_path: str) -> bool:
+    def _race_endpoints(self, endpoints: List[str], track_id: str) -> Optional[str]:
         """
-        下载音频文件
+        同时请求多个接口，返回第一个拿到的地址，不等待其余的请求
+        尚未开始的落后请求直接取消；已发出的请求无法中断，在后台最多再持续 endpoint_timeout 秒，结果只用于更新接口的健康记录
         """
+        if len(endpoints) == 1:
+            return self._try_endpoint(endpoints[0], track_id)
+        
+        futures = [self.race_executor.submit(self._try_endpoint, endpoint, track_id) for endpoint in endpoints]
         try:
-            response = self.session.get(audio_url, stream=True, timeout=30)
+            for future in as_completed(futures):
+                audio_url = future.result()
+                if audio_url:
+                    return audio_url
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _try_endpoint(self, endpoint: str, track_id: str) -> Optional[str]:
+        """
+        请求一个接口并记录其成败
+        """
+        try:
+            audio_url = self._resolve_audio_url(endpoint, track_id)
+        except Exception as e:
+            print(f"获取音频地址异常 ({endpoint}, track_id: {track_id}): {str(e)}")
+            audio_url = None
+        self.endpoint_health.record(endpoint, bool(audio_url))
+        return audio_url
+    
+    def _resolve_audio_url(self, endpoint: str, track_id: str) -> Optional[str]:
+        """
+        通过指定接口获取音频地址，接口名见 AUDIO_URL_ENDPOINTS
+        """
+        if endpoint in ('tracks_https', 'tracks_http'):  # tracks API
+            # 经典的tracks API，从Chrome插件项目中发现
+            scheme = 'https' if endpoint == 'tracks_https' else 'http'
+            response = self.session.get(f'{scheme}://www.ximalaya.com/tracks/{track_id}.json', timeout=self.endpoint_timeout)
+            response.raise_for_status()
+            data = response.json()
+            
+            # 检查tracks API的响应格式
+            if 'play_path_64' in data:
+                return data['play_path_64']
+            elif 'play_path_32' in data:
+                return data['play_path_32']
+            elif 'play_path' in data:
+                return data['play_path']
+                
+        elif endpoint == 'revision_audio':  # revision API
+            params = {'id': track_id, 'ptype': 1}
+            response = self.session.get('https://www.ximalaya.com/revision/play/v1/audio', params=params, timeout=self.endpoint_timeout)
             response.raise_for_status()
+            data = response.json()
+            
+            if data.get('ret') == 200 and 'data' in data and 'src' in data['data']:
+                return data['data']['src']
+                
+        elif endpoint == 'mobile_base_info':  # mobile API
+            params = {'trackId': track_id}
+            response = self.session.get('https://mobile.ximalaya.com/mobile/v1/track/baseInfo', params=params, timeout=self.endpoint_timeout)
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get('ret') == 0 and 'data' in data:
+                if 'playUrl' in data['data']:
+                    return data['data']['playUrl']
+                elif 'src' in data['data']:
+                    return data['data']['src']
+                    
+        elif endpoint == 'track_simple':  # track simple API
+            params = {'trackId': track_id}
+            response = self.session.get('https://www.ximalaya.com/revision/track/simple', params=params, timeout=self.endpoint_timeout)
+            response.raise_for_status()
+            data = response.json()
             
+            if data.get('ret') == 200 and 'data' in data:
+                if 'playPath64' in data['data']:
+                    return data['data']['playPath64']
+                elif 'src' in data['data']:
+                    return data['data']['src']
+        
+        return None
+    
+    def resolve_audio_urls(self, tracks: List[Dict]) -> Dict[str, Optional[str]]:
+        """
+        并发获取一批音频的下载地址，返回 {track_id: 地址}
+        """
+        with ThreadPoolExecutor(max_workers=self.resolve_workers) as executor:
+            audio_urls = executor.map(lambda track: self.get_audio_url(str(track['track_id'])), tracks)
+            return {str(track['track_id']): audio_url for track, audio_url in zip(tracks, audio_urls)}
+    
+    def _host_limiter(self, url: str) -> RateLimiter:
+        """
+        每个音频服务器一个限速器
+        """
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_limiters:
+                self.host_limiters[host] = RateLimiter(self.host_interval)
+            return self.host_limiters[host]
+    
+    def download_audio(self, audio_url: str, file_path: str) -> int:
+        """
+        下载音频文件，返回本次下载的字节数，失败时返回-1
+        先写入 .part 文件，中断后再次下载时用Range从断点继续；大小与服务器声明的一致后才重命名为最终文件
+        """
+        part_path = file_path + '.part'
+        try:
             # 创建目录
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            # 断点续传要求按原始字节计算偏移，不接受压缩传输
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+            
+            self._host_limiter(audio_url).wait()
+            response = self.session.get(audio_url, stream=True, timeout=30, headers=headers)
+            if response.status_code == 416:
+                # .part 文件已经完整或比服务器上的文件还大
+                response.close()
+                total_size = self._content_range_total(response.headers.get('Content-Range', ''))
+                if total_size == offset:
+                    os.replace(part_path, file_path)
+                    return 0
+                os.remove(part_path)
+                return self.download_audio(audio_url, file_path)
+            response.raise_for_status()
+            
+            if response.status_code == 206:
+                total_size = self._content_range_total(response.headers.get('Content-Range', ''))
+                mode = 'ab'
+            else:
+                # 服务器不支持Range，从头下载
+                content_length = response.headers.get('Content-Length')
+                total_size = int(content_length) if content_length and content_length.isdigit() else None
+                offset = 0
+                mode = 'wb'
+            
             # 下载文件
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+            downloaded = 0
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=65536):
                     if chunk:
                         f.write(chunk)
+                        downloaded += len(chunk)
             
-            return True
+            size = offset + downloaded
+            if total_size is not None and size != total_size:
+                print(f"文件大小不一致: 已下载 {size} 字节，服务器声明 {total_size} 字节")
+                if size > total_size:
+                    os.remove(part_path)
+                return -1
+            
+            os.replace(part_path, file_path)
+            return downloaded
         except Exception as e:
             print(f"下载失败: {str(e)}")
-            return False
+            return -1
+    
+    def _content_range_total(self, content_range: str) -> Optional[int]:
+        """
+        从 Content-Range（如 bytes 0-99/1000 或 bytes */1000）中取出文件总大小
+        """
+        match = re.search(r'/(\d+)$', content_range)
+        return int(match.group(1)) if match else None
     
     def sanitize_filename(self, filename: str) -> str:
         """
@@ -703,9 +1041,17 @@ class XimalayaDownloader:
             
         return filename
     
-    def download_album(self, album_id: str, download_dir: str = './downloads', only_free: bool = True):
+    def download_album(self, album_id: str, download_dir: str = './downloads', only_free: bool = True,
+                       sync: bool = False) -> Dict:
         """
         下载整个专辑
+        sync为True时只获取清单中没有的新音频（倒序获取到已知音频为止），只下载新增、失败或缺失的音频
+        """
+        return self.download_albums([album_id], download_dir, only_free, sync)
+    
+    def _prepare_album(self, album_id: str, download_dir: str, only_free: bool, sync: bool):
+        """
+        获取专辑信息、创建下载目录、加载清单，返回 (专辑信息, 下载目录, 清单, 待处理音频的迭代器)，失败时返回None
         """
         print(f"开始下载专辑 ID: {album_id}")
         
@@ -717,76 +1063,164 @@ class XimalayaDownloader:
             print(f"总音频数: {album_info['total_count']}")
         except Exception as e:
             print(f"错误: {str(e)}")
-            return
+            return None
         
         # 创建下载目录
         safe_title = self.sanitize_filename(album_info['title'])
         album_dir = os.path.join(download_dir, safe_title)
         os.makedirs(album_dir, exist_ok=True)
+        manifest = AlbumManifest(os.path.join(album_dir, 'manifest.json'), album_id)
         
-        # 获取所有音频
-        try:
-            tracks = self.get_all_tracks(album_id)
-            print(f"获取到 {len(tracks)} 个音频")
-        except Exception as e:
-            print(f"错误: {str(e)}")
-            return
+        if sync and manifest.tracks:
+            # 增量同步：新音频按正序排在前面，之后是清单中未完成的音频
+            try:
+                new_tracks = list(self.iter_new_tracks(album_id, set(manifest.tracks)))
+            except TrackListError as e:
+                # 不能只处理已获取到的部分新音频：较新的音频写入清单后，下次同步会在它们处停止，漏掉较旧的新音频
+                print(f"{str(e)}，本次只处理清单中未完成的音频，新音频下次同步时再获取")
+                new_tracks = []
+            unfinished_tracks = manifest.unfinished_tracks()
+            print(f"增量同步: 新音频 {len(new_tracks)} 个，未完成的音频 {len(unfinished_tracks)} 个")
+            tracks = itertools.chain(reversed(new_tracks), unfinished_tracks)
+        else:
+            if sync:
+                print("没有找到专辑清单，获取完整列表")
+            # 音频列表分页并发获取，按顺序边获取边下载
+            tracks = self.iter_tracks(album_id, album_info['total_count'])
         
         # 过滤免费音频
         if only_free:
-            free_tracks = [track for track in tracks if track['is_free']]
-            print(f"其中免费音频: {len(free_tracks)} 个")
-            tracks = free_tracks
-        
-        # 下载音频
-        success_count = 0
-        failed_count = 0
-        
-        for i, track in enumerate(tracks, 1):
-            print(f"\n[{i}/{len(tracks)}] 正在处理: {track['title']}")
-            
-            # 获取音频下载地址
-            audio_url = self.get_audio_url(str(track['track_id']))
-            if not audio_url:
-                print("  ❌ 获取下载地址失败")
-                failed_count += 1
-                continue
-            
-            # 构造文件名
-            safe_title = self.sanitize_filename(track['title'])
-            # 根据音频URL确定文件扩展名
-            if '.m4a' in audio_url:
-                ext = '.m4a'
-            elif '.mp3' in audio_url:
-                ext = '.mp3'
-            else:
-                ext = '.m4a'  # 默认扩展名
-                
-            filename = f"{track['index']:03d}_{safe_title}{ext}"
-            file_path = os.path.join(album_dir, filename)
-            
-            # 检查文件是否已存在
-            if os.path.exists(file_path):
-                print("  ✅ 文件已存在，跳过")
-                success_count += 1
-                continue
+            tracks = (track for track in tracks if track['is_free'])
+        return album_info, album_dir, manifest, tracks
+    
+    def download_albums(self, album_ids: List[str], download_dir: str = './downloads', only_free: bool = True,
+                        sync: bool = False) -> Dict:
+        """
+        下载多个专辑：所有专辑的音频提交到同一个下载线程池，共用登录会话和按服务器的限速
+        返回汇总统计 {'success', 'failed', 'skipped', 'bytes', 'elapsed'}
+        """
+        albums = {}
+        start_time = time.time()
+        
+        # 下载音频：列表边获取边提交给下载线程池，完成一个打印一个
+        # 同时在下载的音频最多比已完成的多一页：等上一页基本下完才获取下一页的地址，避免签名地址排队时过期；
+        # 这个上限由所有专辑共用，上一个专辑的最后一页下载时即开始准备下一个专辑
+        pending = {}
+        progress = {'done': 0, 'submitted': 0, 'bytes': 0, 'start_time': start_time}
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                for album_id in album_ids:
+                    prepared = self._prepare_album(album_id, download_dir, only_free, sync)
+                    if prepared is None:
+                        continue
+                    album_info, album_dir, manifest, tracks = prepared
+                    album = albums[album_id] = {'title': album_info['title'], 'dir': album_dir, 'manifest': manifest,
+                                                'success': 0, 'failed': 0, 'skipped': 0, 'bytes': 0, 'pending': 0}
+                    # 每凑满一页就批量获取下载地址，下载线程处理上一页的同时获取下一页的地址
+                    for batch in batched(tracks, 30):
+                        self._wait_downloads(pending, 30, progress)
+                        # 清单中已完成且文件仍在的音频直接跳过，不再获取下载地址
+                        todo = [track for track in batch if not manifest.is_done(str(track['track_id']))]
+                        album['skipped'] += len(batch) - len(todo)
+                        # 清单中未过期的地址直接使用
+                        audio_urls = {str(track['track_id']): manifest.cached_url(str(track['track_id'])) for track in todo}
+                        audio_urls.update(self.resolve_audio_urls([track for track in todo if not audio_urls[str(track['track_id'])]]))
+                        for track in todo:
+                            audio_url = audio_urls[str(track['track_id'])]
+                            if audio_url and audio_url != manifest.tracks.get(str(track['track_id']), {}).get('audio_url'):
+                                manifest.update(track, audio_url=audio_url, url_expires=audio_url_expiry(audio_url))
+                            manifest.update(track, status='pending')
+                            future = executor.submit(self._download_track, track, album_dir, audio_url)
+                            pending[future] = (album, track)
+                            album['pending'] += 1
+                            progress['submitted'] += 1
+                        manifest.save()
+                self._wait_downloads(pending, 0, progress)
+        finally:
+            for album in albums.values():
+                album['manifest'].save()
+        
+        elapsed = time.time() - start_time
+        summary = {key: sum(album[key] for album in albums.values()) for key in ('success', 'failed', 'skipped', 'bytes')}
+        summary['elapsed'] = elapsed
+        print(f"\n下载完成!")
+        if len(album_ids) > 1:
+            print(f"专辑: {len(albums)}/{len(album_ids)} 个")
+            for album in albums.values():
+                print(f"  {album['title']}: 成功 {album['success']} 个, 失败 {album['failed']} 个, "
+                      f"已完成跳过 {album['skipped']} 个, {album['bytes'] / 1024 / 1024:.1f} MB, 目录 {album['dir']}")
+        print(f"成功: {summary['success']} 个")
+        print(f"失败: {summary['failed']} 个")
+        print(f"已完成跳过: {summary['skipped']} 个")
+        print(f"下载量: {summary['bytes'] / 1024 / 1024:.1f} MB，用时 {elapsed:.1f} 秒，平均 {summary['bytes'] / 1024 / 1024 / max(elapsed, 0.001):.2f} MB/s")
+        print(f"获取地址接口: {self.endpoint_health.report()}")
+        if len(album_ids) == 1 and albums:
+            print(f"下载目录: {albums[album_ids[0]]['dir']}")
+        return summary
+    
+    def _wait_downloads(self, pending: Dict, max_pending: int, progress: Dict):
+        """
+        等待下载完成，直到未完成的数量不超过 max_pending；每完成一个更新清单并打印进度
+        pending: {future: (专辑统计, 音频)}，完成的future会从中移除
+        """
+        while len(pending) > max_pending:
+            done_futures, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                album, track = pending.pop(future)
+                manifest = album['manifest']
+                result = future.result()
+                progress['done'] += 1
+                album['pending'] -= 1
+                if result['downloaded'] < 0:
+                    manifest.update(track, status='failed')
+                    print(f"[{progress['done']}/{progress['submitted']}] ❌ {track['title']}")
+                    album['failed'] += 1
+                else:
+                    manifest.update(track, status='done', file=result['file'], size=result['size'], sha256=result['sha256'])
+                    album['success'] += 1
+                    album['bytes'] += result['downloaded']
+                    progress['bytes'] += result['downloaded']
+                    elapsed = time.time() - progress['start_time']
+                    print(f"[{progress['done']}/{progress['submitted']}] ✅ {track['title']} "
+                          f"（已下载 {progress['bytes'] / 1024 / 1024:.1f} MB，平均 {progress['bytes'] / 1024 / 1024 / max(elapsed, 0.001):.2f} MB/s）")
+                # 专辑的音频全部下载完时立即保存其清单，其余时候每完成20个保存一次
+                if progress['done'] % 20 == 0 or album['pending'] == 0:
+                    manifest.save()
+    
+    def _download_track(self, track: Dict, album_dir: str, audio_url: Optional[str]) -> Dict:
+        """
+        下载单个音频，在下载线程中运行
+        返回 {'downloaded': 本次下载的字节数（已存在时为0，失败时为-1）, 'file': 文件名, 'size': 文件大小, 'sha256': 校验和}
+        """
+        if not audio_url:
+            print(f"  ❌ 获取下载地址失败: {track['title']}")
+            return {'downloaded': -1}
+        
+        # 构造文件名
+        safe_title = self.sanitize_filename(track['title'])
+        # 根据音频URL确定文件扩展名
+        if '.m4a' in audio_url:
+            ext = '.m4a'
+        elif '.mp3' in audio_url:
+            ext = '.mp3'
+        else:
+            ext = '.m4a'  # 默认扩展名
             
+        filename = f"{track['index']:03d}_{safe_title}{ext}"
+        file_path = os.path.join(album_dir, filename)
+        
+        # 检查文件是否已存在（未下载完的文件是 .part，不会被当成已存在）
+        if os.path.exists(file_path):
+            print(f"  ✅ 文件已存在，跳过: {filename}")
+            downloaded = 0
+        else:
             # 下载文件
-            print(f"  📥 正在下载...")
-            if self.download_audio(audio_url, file_path):
-                print(f"  ✅ 下载成功")
-                success_count += 1
-            else:
-                print(f"  ❌ 下载失败")
-                failed_count += 1
-            
-            # 避免请求过快
-            time.sleep(1)
+            print(f"  📥 正在下载: {filename}")
+            downloaded = self.download_audio(audio_url, file_path)
+            if downloaded < 0:
+                return {'downloaded': -1}
         
-        print(f"\n下载完成!")
-        print(f"成功: {success_count} 个")
-        print(f"失败: {failed_count} 个")
-        print(f"下载目录: {album_dir}")
+        return {'downloaded': downloaded, 'file': filename, 'size': os.path.getsize(file_path), 'sha256': file_sha256(file_path)}
 
 
 def main():
@@ -796,14 +1230,26 @@ def main():
         print("  python ximalaya_downloader.py 12891461")
         print("  python ximalaya_downloader.py https://www.ximalaya.com/album/12891461")
         print("  python ximalaya_downloader.py --login https://www.ximalaya.com/album/12891461")
+        print("  python ximalaya_downloader.py --batch=albums.txt --sync")
         print("选项:")
         print("  --login    强制重新登录")
         print("  --no-login 跳过登录检查")
+        print("  --workers=N 同时下载的音频数（默认4）")
+        print("  --sync     增量同步：只获取新音频，只下载新增、失败或缺失的音频")
+        print("  --batch=FILE 批量下载文件中列出的专辑（每行一个专辑ID或URL，#开头为注释）")
         sys.exit(1)
     
     # 解析命令行参数
     force_login = '--login' in sys.argv
     no_login = '--no-login' in sys.argv
+    sync = '--sync' in sys.argv
+    download_workers = 4
+    batch_file = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--workers='):
+            download_workers = int(arg.split('=', 1)[1])
+        elif arg.startswith('--batch='):
+            batch_file = arg.split('=', 1)[1]
     
     # 找到专辑URL或ID（不是选项参数）
     url_or_id = None
@@ -812,11 +1258,20 @@ def main():
             url_or_id = arg
             break
     
-    if not url_or_id:
+    if batch_file:
+        try:
+            with open(batch_file, 'r', encoding='utf-8') as f:
+                urls_or_ids = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+        except OSError as e:
+            print(f"错误: 无法读取专辑列表文件: {e}")
+            sys.exit(1)
+    elif url_or_id:
+        urls_or_ids = [url_or_id]
+    else:
         print("错误: 请提供专辑ID或专辑URL")
         sys.exit(1)
     
-    downloader = XimalayaDownloader()
+    downloader = XimalayaDownloader(download_workers=download_workers)
     
     # 登录检查
     if not no_login:
@@ -830,8 +1285,9 @@ def main():
                 downloader.ensure_login()
     
     try:
-        album_id = downloader.extract_album_id(url_or_id)
-        downloader.download_album(album_id)
+        album_ids = list(dict.fromkeys(downloader.extract_album_id(url_or_id) for url_or_id in urls_or_ids))
+        # 所有专辑共用同一个登录会话和下载线程池
+        downloader.download_albums(album_ids, sync=sync)
     except Exception as e:
         print(f"错误: {str(e)}")
         sys.exit(1)